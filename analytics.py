@@ -0,0 +1,120 @@
+import csv
+import json
+from datetime import datetime
+
+
+# =========================
+# Накопительная статистика: выручка / записи / занятые минуты
+# =========================
+# Агрегаты обновляются на каждой записи и удалении (+1 / -1),
+# поэтому для отчёта не нужно заново проходить по всем appointments.
+
+def week_key(date_str: str):
+    # 2026-02-15 -> "2026-W07" (ISO-неделя)
+    year, week, _ = datetime.strptime(date_str, "%Y-%m-%d").date().isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+class Aggregates:
+    # значение каждого ключа — list [выручка, число записей, занятые минуты]
+
+    def __init__(self):
+        self.by_day = {}
+        self.by_week = {}
+        self.by_service = {}
+        self.total = [0, 0, 0]
+
+    def reset(self):
+        self.by_day.clear()
+        self.by_week.clear()
+        self.by_service.clear()
+        self.total = [0, 0, 0]
+
+    @staticmethod
+    def _bump(table: dict, key, price, minutes, sign: int):
+        row = table.get(key)
+        if row is None:
+            row = table[key] = [0, 0, 0]
+        row[0] += sign * price
+        row[1] += sign
+        row[2] += sign * minutes
+        # пустые строки убираем, чтобы память не росла от удалённых дней
+        if row[1] == 0:
+            del table[key]
+
+    def _apply(self, date_str: str, booking: dict, sign: int):
+        price = booking.get("price", 0) or 0
+        minutes = booking.get("duration", 0) or 0
+        self._bump(self.by_day, date_str, price, minutes, sign)
+        self._bump(self.by_week, week_key(date_str), price, minutes, sign)
+        self._bump(self.by_service, booking.get("service", ""), price, minutes, sign)
+        self.total[0] += sign * price
+        self.total[1] += sign
+        self.total[2] += sign * minutes
+
+    def add(self, date_str: str, booking: dict):
+        self._apply(date_str, booking, 1)
+
+    def remove(self, date_str: str, booking: dict):
+        self._apply(date_str, booking, -1)
+
+    def utilization(self, date_str: str, open_minutes: int):
+        # доля занятого времени от рабочего времени дня (0..1)
+        if not open_minutes:
+            return 0.0
+        row = self.by_day.get(date_str)
+        return (row[2] if row else 0) / open_minutes
+
+
+# =========================
+# Потоковый экспорт
+# =========================
+EXPORT_FIELDS = ["id", "date", "time", "name", "phone", "service", "duration", "price", "created_at"]
+EXPORT_CHUNK = 1000
+
+
+def snapshot_days(appointments: dict):
+    # снимок структуры дней: копируются только списки ссылок на записи,
+    # сами записи не копируются. Делать на event loop, до передачи в поток —
+    # дальше хендлеры могут спокойно менять appointments.
+    return [(date_str, tuple(appointments[date_str])) for date_str in sorted(appointments)]
+
+
+def iter_bookings(days):
+    # генератор по снимку [(date_str, записи), ...]: по одной записи, без сборки общего списка
+    for date_str, day in days:
+        for b in day:
+            row = {k: b.get(k, "") for k in EXPORT_FIELDS}
+            row["date"] = date_str
+            yield row
+
+
+def _chunks(rows, size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def export_csv(path: str, rows, chunk_size: int = EXPORT_CHUNK):
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for chunk in _chunks(rows, chunk_size):
+            writer.writerows(chunk)
+            count += len(chunk)
+    return count
+
+
+def export_jsonl(path: str, rows, chunk_size: int = EXPORT_CHUNK):
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for chunk in _chunks(rows, chunk_size):
+            f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in chunk))
+            count += len(chunk)
+    return count
@@ -1,12 +1,21 @@
 import os
 import sys
 import json
+import re
+import tempfile
+import traceback
 import asyncio
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque
+from functools import lru_cache
 from datetime import datetime, timedelta, time
+from time import monotonic
 
-from aiogram import Bot, Dispatcher, F
+from aiogram import Bot, Dispatcher, Router, F, BaseMiddleware
 from aiogram.types import (
     Message,
+    FSInputFile,
     ReplyKeyboardMarkup,
     KeyboardButton,
     ReplyKeyboardRemove,
@@ -17,18 +26,36 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import BOT_TOKEN, MASTER_ID, DEMO_MODE
+from analytics import Aggregates, snapshot_days, iter_bookings, export_csv, export_jsonl
 
 
 # =========================
 # 0) Защита от второго запуска
 # =========================
+# вызывается только при запуске бота, импорт модуля ничего не пишет на диск
 LOCK_FILE = "bot.lock"
-if os.path.exists(LOCK_FILE):
-    print("❌ Бот уже запущен. Закрой прошлый запуск (терминал) и попробуй снова.")
-    sys.exit(1)
 
-with open(LOCK_FILE, "w", encoding="utf-8") as f:
-    f.write("locked")
+
+def try_lock():
+    # атомарно: файл создаётся, только если его ещё нет (бот и импорт не пересекутся)
+    try:
+        fd = os.open(LOCK_FILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write("locked")
+    return True
+
+
+def acquire_lock():
+    if not try_lock():
+        print("❌ Бот уже запущен (или идёт импорт). Закрой прошлый запуск (терминал) и попробуй снова.")
+        sys.exit(1)
+
+
+def release_lock():
+    if os.path.exists(LOCK_FILE):
+        os.remove(LOCK_FILE)
 
 
 # =========================
@@ -43,6 +70,8 @@ services = []       # [{"name":"Массаж","price":80,"duration":60}, ...]
 overrides = {}      # {"2026-02-15": None | ["10:00","10:30"...]}
 appointments = {}   # {"2026-02-15": [ {booking}, {booking} ]}
 contacts = {"phone": "", "address": ""}
+resources = [{"name": "Стол 1", "services": []}]  # services пустой — подходит для любой услуги
+waitlist_by_id = {}  # {id: {"id":..., "user_id":..., "service":"...", "duration":60, "dates":[...]}}
 import os
 DATA_FILE = os.path.join(os.getcwd(), "data.json")
 
@@ -56,13 +85,89 @@ def save_data():
         "overrides": overrides,
         "appointments": appointments,
         "contacts": contacts,
+        "resources": resources,
+        "waitlist": list(waitlist_by_id.values()),
     }
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
+    # пишем во временный файл и подменяем одним rename — файл не бывает записан наполовину
+    tmp_file = DATA_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, DATA_FILE)
+
+
+class DataFileError(Exception):
+    # data.json не читается или в нём сломанные данные — работать на таком нельзя
+    pass
+
+
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_TIME_RE = re.compile(r"\d{2}:\d{2}")
+
+
+def _is_time(t):
+    return isinstance(t, str) and _TIME_RE.fullmatch(t) is not None
+
+
+def _is_number(x):
+    return isinstance(x, (int, float)) and not isinstance(x, bool)
+
+
+def validate_data(data):
+    # возвращает None, если всё в порядке, иначе — описание первой проблемы
+    if not isinstance(data, dict):
+        return "ожидался JSON-объект"
+
+    svc = data.get("services", [])
+    if not isinstance(svc, list):
+        return "services: ожидался список"
+    for i, s in enumerate(svc):
+        if not (isinstance(s, dict) and isinstance(s.get("name"), str)
+                and _is_number(s.get("price")) and isinstance(s.get("duration"), int)):
+            return f"services[{i}]: нужны name, price, duration"
+
+    ov = data.get("overrides", {})
+    if not isinstance(ov, dict):
+        return "overrides: ожидался объект"
+    for d, times in ov.items():
+        if times is not None and not (isinstance(times, list) and all(_is_time(t) for t in times)):
+            return f"overrides[{d}]: ожидался null или список времени ЧЧ:ММ"
+
+    appts = data.get("appointments", {})
+    if not isinstance(appts, dict):
+        return "appointments: ожидался объект"
+    for d, day in appts.items():
+        if not _DATE_RE.fullmatch(d) or not isinstance(day, list):
+            return f"appointments[{d}]: ожидался список записей на дату ГГГГ-ММ-ДД"
+        for i, b in enumerate(day):
+            where = f"appointments[{d}][{i}]"
+            if not isinstance(b, dict):
+                return f"{where}: ожидался объект"
+            if not _is_time(b.get("time")):
+                return f"{where}: нет времени ЧЧ:ММ"
+            if not (isinstance(b.get("block"), list) and all(_is_time(t) for t in b["block"])):
+                return f"{where}: нет блока слотов"
+            if not (isinstance(b.get("duration"), int) and _is_number(b.get("price"))):
+                return f"{where}: нет длительности или цены"
+            for key in ("service", "name", "phone"):
+                if not isinstance(b.get(key), str):
+                    return f"{where}: нет поля {key}"
+
+    if not isinstance(data.get("contacts", {}), dict):
+        return "contacts: ожидался объект"
+
+    res = data.get("resources") or []
+    if not (isinstance(res, list) and all(isinstance(r, dict) and isinstance(r.get("name"), str) for r in res)):
+        return "resources: ожидался список объектов с name"
+
+    if not isinstance(data.get("waitlist", []), list):
+        return "waitlist: ожидался список"
+    return None
 
 
 def load_data():
-    global services, overrides, appointments, contacts
+    # Сломанный data.json — DataFileError, а не тихий сброс в пустые данные:
+    # иначе следующий save_data() затрёт файл, а занятое время станет свободным.
+    global services, overrides, appointments, contacts, resources
 
     if not os.path.exists(DATA_FILE):
         # первый запуск — создаём пустой файл
@@ -72,17 +177,304 @@ def load_data():
     try:
         with open(DATA_FILE, "r", encoding="utf-8") as f:
             data = json.load(f)
-        services = data.get("services", [])
-        overrides = data.get("overrides", {})
-        appointments = data.get("appointments", {})
-        contacts = data.get("contacts", {"phone": "", "address": ""})
-    except Exception:
-        # если файл сломан — не падаем
-        services = []
-        overrides = {}
-        appointments = {}
-        contacts = {"phone": "", "address": ""}
-        
+    except (OSError, ValueError) as e:
+        raise DataFileError(f"{DATA_FILE} не читается: {e}") from e
+
+    problem = validate_data(data)
+    if problem:
+        raise DataFileError(f"{DATA_FILE}: {problem}")
+
+    # глобальные данные меняем только после проверки всего файла
+    services = data.get("services", [])
+    overrides = data.get("overrides", {})
+    appointments = data.get("appointments", {})
+    contacts = data.get("contacts", {"phone": "", "address": ""})
+    resources = data.get("resources") or [{"name": "Стол 1", "services": []}]
+    repaired = reindex_appointments()
+    reindex_waitlist(data.get("waitlist", []))
+
+    if repaired:
+        # старым записям без id или с повторяющимся id выдали новые — сохраняем
+        save_data()
+
+
+# =========================
+# 2.1) Id записей и индекс id -> запись
+# =========================
+# id в стиле snowflake: (миллисекунды от ID_EPOCH_MS << ID_SEQ_BITS) | счётчик внутри миллисекунды.
+# Растут монотонно и не совпадают, даже если две записи сделаны в одну миллисекунду.
+# Своя эпоха держит id ниже 2^53 (точные числа в JSON/JS) ещё ~69 лет.
+ID_SEQ_BITS = 12
+ID_EPOCH_MS = 1767225600000  # 2026-01-01 00:00 UTC
+_id_lock = threading.Lock()
+_last_id = 0
+
+bookings_by_id = {}  # {id: (date_str, booking)}
+busy_masks = {}      # {date_str: {resource_name: битовая маска занятых слотов}}
+stats = Aggregates()  # выручка/записи/минуты по дням, неделям и услугам
+
+
+def new_booking_id():
+    global _last_id
+    with _id_lock:
+        candidate = (int(datetime.now().timestamp() * 1000) - ID_EPOCH_MS) << ID_SEQ_BITS
+        # часы могли отстать или в этой миллисекунде уже выдавали id — берём следующий
+        if candidate <= _last_id:
+            candidate = _last_id + 1
+        _last_id = candidate
+        return candidate
+
+
+def _booking_time(b):
+    return b["time"]
+
+
+def reindex_appointments():
+    # вызывается после загрузки: сортируем дни один раз и строим индекс.
+    # Возвращает True, если каким-то записям пришлось выдать новый id.
+    global _last_id
+    bookings_by_id.clear()
+    busy_masks.clear()
+    stats.reset()
+    # в старых данных id мог отсутствовать или совпадать (две записи в одну миллисекунду)
+    needs_id = []
+    for date_str, day_list in appointments.items():
+        day_list.sort(key=_booking_time)
+        for b in day_list:
+            # старые записи (до нескольких ресурсов) сидят на первом ресурсе
+            b.setdefault("resource", resources[0]["name"])
+            if not isinstance(b.get("id"), int) or b["id"] in bookings_by_id:
+                needs_id.append((date_str, b))
+            else:
+                bookings_by_id[b["id"]] = (date_str, b)
+            _mark_busy(date_str, b, True)
+            stats.add(date_str, b)
+    with _id_lock:
+        _last_id = max(_last_id, max(bookings_by_id, default=0))
+    for date_str, b in needs_id:
+        b["id"] = new_booking_id()
+        bookings_by_id[b["id"]] = (date_str, b)
+    return bool(needs_id)
+
+
+def _mark_busy(date_str: str, booking: dict, busy: bool):
+    masks = busy_masks.setdefault(date_str, {})
+    name = booking.get("resource", resources[0]["name"])
+    bm = block_mask(booking.get("block", []))
+    masks[name] = (masks.get(name, 0) | bm) if busy else (masks.get(name, 0) & ~bm)
+    if not masks[name]:
+        del masks[name]
+    if not masks:
+        busy_masks.pop(date_str, None)
+
+
+def add_booking(date_str: str, booking: dict):
+    # вставка в уже отсортированный день без пересортировки
+    insort(appointments.setdefault(date_str, []), booking, key=_booking_time)
+    bookings_by_id[booking["id"]] = (date_str, booking)
+    _mark_busy(date_str, booking, True)
+    stats.add(date_str, booking)
+
+
+def remove_booking(booking_id):
+    # возвращает (date_str, booking) или None, если такой записи нет
+    found = bookings_by_id.pop(booking_id, None)
+    if found is None:
+        return None
+    date_str, booking = found
+    _mark_busy(date_str, booking, False)
+    stats.remove(date_str, booking)
+    day_list = appointments.get(date_str, [])
+    i = bisect_left(day_list, booking["time"], key=_booking_time)
+    while i < len(day_list) and day_list[i] is not booking:
+        i += 1
+    if i < len(day_list):
+        del day_list[i]
+    # если день пустой — можно удалить ключ
+    if not day_list:
+        appointments.pop(date_str, None)
+    return found
+
+
+# =========================
+# 2.2) Лист ожидания
+# =========================
+# Индекс: {date_str: {(service, duration): deque[entry_id]}}. Услуга в ключе нужна,
+# потому что окна зависят от того, какие ресурсы подходят для услуги. Id растут монотонно,
+# поэтому порядок в deque — это FIFO. Заявка уходит из индекса сразу при удалении
+# (или при снятии одной даты), поэтому в голове очереди всегда живая заявка.
+WAITLIST_BATCH = 10        # сколько человек максимум оповещаем за одно освобождение дня
+WAITLIST_SEND_DELAY = 0.1  # пауза между сообщениями (лимиты Telegram)
+
+waitlist_index = {}   # {date_str: {(service, duration): deque[id]}}
+
+
+def _index_waitlist_entry(entry: dict):
+    for d in entry["dates"]:
+        key = (entry["service"], entry["duration"])
+        waitlist_index.setdefault(d, {}).setdefault(key, deque()).append(entry["id"])
+
+
+def _valid_waitlist_entry(entry):
+    return (
+        isinstance(entry, dict)
+        and isinstance(entry.get("id"), int)
+        and isinstance(entry.get("user_id"), int)
+        and isinstance(entry.get("service"), str)
+        and isinstance(entry.get("duration"), int) and entry["duration"] > 0
+        and isinstance(entry.get("dates"), list)
+        and all(isinstance(d, str) for d in entry["dates"])
+    )
+
+
+def reindex_waitlist(entries: list[dict]):
+    # выбрасываем сломанные заявки и заявки, у которых все даты уже прошли
+    global _last_id
+    today = datetime.today().date().strftime("%Y-%m-%d")
+    waitlist_by_id.clear()
+    waitlist_index.clear()
+
+    valid = []
+    for entry in entries if isinstance(entries, list) else []:
+        if _valid_waitlist_entry(entry):
+            valid.append(entry)
+        else:
+            print(f"⚠️ Пропущена сломанная заявка листа ожидания: {entry!r}")
+
+    for entry in sorted(valid, key=lambda e: e["id"]):
+        if entry["id"] in waitlist_by_id:
+            print(f"⚠️ Пропущена заявка листа ожидания с повторным id: {entry!r}")
+            continue
+        entry["dates"] = [d for d in entry["dates"] if d >= today]
+        if not entry["dates"]:
+            continue
+        waitlist_by_id[entry["id"]] = entry
+        _index_waitlist_entry(entry)
+    with _id_lock:
+        _last_id = max(_last_id, max(waitlist_by_id, default=0))
+
+
+def add_to_waitlist(user_id: int, service: dict, dates: list[str]):
+    # один человек — одна заявка на услугу: повторная заявка заменяет старую
+    for entry in waitlist_by_id.values():
+        if entry["user_id"] == user_id and entry["service"] == service["name"]:
+            remove_from_waitlist(entry["id"])
+            break
+    entry = {
+        "id": new_booking_id(),
+        "user_id": user_id,
+        "service": service["name"],
+        "duration": service["duration"],
+        "dates": list(dates),
+    }
+    waitlist_by_id[entry["id"]] = entry
+    _index_waitlist_entry(entry)
+    return entry
+
+
+def _unindex_waitlist_entry(entry: dict, dates):
+    key = (entry["service"], entry["duration"])
+    for d in dates:
+        by_key = waitlist_index.get(d)
+        queue = by_key.get(key) if by_key else None
+        if queue is None:
+            continue
+        try:
+            queue.remove(entry["id"])
+        except ValueError:
+            pass
+        if not queue:
+            del by_key[key]
+        if not by_key:
+            del waitlist_index[d]
+
+
+def remove_from_waitlist(entry_id):
+    entry = waitlist_by_id.pop(entry_id, None)
+    if entry is not None:
+        _unindex_waitlist_entry(entry, entry["dates"])
+    return entry
+
+
+def drop_waitlist_date(entry: dict, date_str: str):
+    # человеку предложили эту дату — на остальные даты он остаётся в очереди
+    _unindex_waitlist_entry(entry, [date_str])
+    entry["dates"] = [d for d in entry["dates"] if d != date_str]
+    if not entry["dates"]:
+        waitlist_by_id.pop(entry["id"], None)
+
+
+def drop_waitlist_for(user_id: int, service_name: str):
+    # человек записался сам — заявка на эту услугу больше не нужна
+    for entry in waitlist_by_id.values():
+        if entry["user_id"] == user_id and entry["service"] == service_name:
+            return remove_from_waitlist(entry["id"])
+    return None
+
+
+def match_waitlist(date_str: str, limit: int = WAITLIST_BATCH):
+    # кого можно позвать на date_str: смотрим только пары (услуга, длительность),
+    # записанные на эту дату, окна для каждой считаем один раз (с учётом ресурсов
+    # услуги), а людей берём по общему FIFO среди всех подходящих очередей
+    # (наименьший id в голове очереди).
+    # Зовём не больше людей, чем реально помещается: под каждого занимаем самое
+    # раннее окно в копии свободных масок ресурсов; нет окна — очередь закончилась.
+    by_key = waitlist_index.get(date_str)
+    open_mask = day_open_mask(date_str)
+    if not by_key or open_mask is None:
+        return []
+
+    fitting = {}
+    for service_name, duration in by_key:
+        starts = available_start_times_for_service(date_str, duration, service_name)
+        if starts:
+            fitting[(service_name, duration)] = starts
+
+    masks = busy_masks.get(date_str, {})
+    free = {r["name"]: open_mask & ~masks.get(r["name"], 0) for r in resources}
+
+    found = []
+    while fitting and len(found) < limit:
+        key = min(fitting, key=lambda k: by_key[k][0])
+        service_name, duration = key
+        slots = duration_to_slots(duration)
+        for name in compatible_resources(service_name):
+            fit = _fit_starts(free[name], slots)
+            if fit:
+                first = (fit & -fit).bit_length() - 1
+                free[name] &= ~(((1 << slots) - 1) << first)
+                break
+        else:
+            del fitting[key]
+            continue
+
+        entry = waitlist_by_id[by_key[key][0]]
+        drop_waitlist_date(entry, date_str)
+        found.append((entry, fitting[key]))
+        if key not in by_key:
+            del fitting[key]
+    return found
+
+
+async def notify_waitlist(bot: Bot, date_str: str):
+    found = match_waitlist(date_str)
+    if not found:
+        return
+    save_data()
+    for entry, starts in found:
+        try:
+            await bot.send_message(
+                entry["user_id"],
+                "🔔 Освободилось время!\n"
+                f"Услуга: {entry['service']}\n"
+                f"Дата: {fmt_date(date_str)}\n"
+                f"Свободно: {', '.join(starts[:6])}\n\n"
+                "Нажмите «📅 Записаться», чтобы занять окно."
+            )
+        except Exception:
+            pass
+        await asyncio.sleep(WAITLIST_SEND_DELAY)
+
 
 # =========================
 # 3) Кнопки
@@ -90,6 +482,8 @@ def load_data():
 BACK_TO_MENU = "⬅️ В меню"
 BACK_TO_DATES = "⬅️ К датам"
 CANCEL = "❌ Отмена"
+WAIT_THIS_DATE = "🔔 Ждать окно в этот день"
+WAIT_ANY_DATE = "🔔 Ждать окно в любой день (14 дней)"
 
 ADMIN_RECORDS_TODAY = "📋 Записи: сегодня"
 ADMIN_RECORDS_TOM = "📋 Записи: завтра"
@@ -97,6 +491,7 @@ ADMIN_RECORDS_ALL = "📋 Записи: все"
 ADMIN_DELETE = "🗑 Удалить запись"
 ADMIN_FREE = "🕒 Свободные окна"
 ADMIN_CONTACTS = "📍 Контакты (настроить)"
+ADMIN_STATS = "📊 Статистика"
 
 client_kb = ReplyKeyboardMarkup(
     keyboard=[
@@ -114,7 +509,7 @@ admin_kb = ReplyKeyboardMarkup(
         [KeyboardButton(text=ADMIN_RECORDS_TODAY), KeyboardButton(text=ADMIN_RECORDS_TOM)],
         [KeyboardButton(text=ADMIN_RECORDS_ALL)],
         [KeyboardButton(text=ADMIN_DELETE), KeyboardButton(text=ADMIN_FREE)],
-        [KeyboardButton(text=ADMIN_CONTACTS)],
+        [KeyboardButton(text=ADMIN_CONTACTS), KeyboardButton(text=ADMIN_STATS)],
         [KeyboardButton(text="💆‍♀️ Услуги и цены")],
     ],
     resize_keyboard=True,
@@ -165,10 +560,15 @@ def next_14_days():
     today = datetime.today().date()
     return [(today + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(14)]
 
+@lru_cache(maxsize=1)
+def _std_times():
+    # стандартная сетка дня не меняется — строим один раз
+    return tuple(gen_times(BASE_START, BASE_END, STEP_MIN))
+
 def day_times(date_str: str):
     if date_str in overrides:
         return overrides[date_str]  # None или список
-    return gen_times(BASE_START, BASE_END, STEP_MIN)
+    return list(_std_times())
 
 def parse_ranges(text: str):
     # "10-12" или "10-12, 16-18"
@@ -194,34 +594,116 @@ def build_block(start_time: str, duration_min: int):
         cur += timedelta(minutes=STEP_MIN)
     return block
 
+# Каждый день — это сетка слотов от 00:00 с шагом STEP_MIN. Занятость ресурса
+# на день хранится как int-битмаска (бит i = слот i), поэтому проверка
+# "блок из k слотов свободен" для всех стартов и всех ресурсов делается
+# несколькими побитовыми операциями, без перебора слотов в Python.
+def slot_index(t: str):
+    h, m = map(int, t.split(":"))
+    return (h * 60 + m) // STEP_MIN
+
+def slot_time(i: int):
+    minutes = i * STEP_MIN
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def block_mask(block: list[str]):
+    mask = 0
+    for t in block:
+        mask |= 1 << slot_index(t)
+    return mask
+
+@lru_cache(maxsize=1)
+def _std_open_mask():
+    return block_mask(_std_times())
+
+def day_open_mask(date_str: str):
+    # маска рабочих слотов дня; None — выходной
+    if date_str in overrides:
+        times = overrides[date_str]
+        return None if times is None else block_mask(times)
+    return _std_open_mask()
+
+def compatible_resources(service_name: str | None):
+    # service_name=None — любой ресурс
+    return [
+        r["name"] for r in resources
+        if service_name is None or not r.get("services") or service_name in r["services"]
+    ]
+
+def _fit_starts(free: int, slots_needed: int):
+    # бит s остаётся, если свободны слоты s .. s+slots_needed-1
+    fit = free
+    for i in range(1, slots_needed):
+        fit &= free >> i
+    return fit
+
 def get_busy_slots(date_str: str):
-    # занятые слоты считаем из записей
-    busy = set()
-    for b in appointments.get(date_str, []):
-        for t in b.get("block", []):
-            busy.add(t)
-    return busy
-
-def available_start_times_for_service(date_str: str, duration_min: int):
+    # занятым считается слот, где заняты все ресурсы (свободной ёмкости нет)
+    masks = busy_masks.get(date_str, {})
+    full = -1
+    for r in resources:
+        full &= masks.get(r["name"], 0)
+    if full <= 0:
+        return set()
+    return {slot_time(i) for i in range(full.bit_length()) if full >> i & 1}
+
+def available_start_times_for_service(date_str: str, duration_min: int, service_name: str | None = None):
     times = day_times(date_str)
     if times is None:
         return []
 
-    times_set = set(times)
-    busy = get_busy_slots(date_str)
+    slots_needed = duration_to_slots(duration_min)
+    if slots_needed <= 0:
+        return []
 
-    res = []
-    for t in times:
-        block = build_block(t, duration_min)
-        # блок должен полностью существовать в расписании дня
-        if not all(x in times_set for x in block):
+    # блок должен полностью существовать в расписании дня и быть свободен
+    # хотя бы на одном подходящем ресурсе — считаем сразу для всех стартов
+    open_mask = day_open_mask(date_str)
+    masks = busy_masks.get(date_str, {})
+    fit_any = 0
+    for name in compatible_resources(service_name):
+        fit_any |= _fit_starts(open_mask & ~masks.get(name, 0), slots_needed)
+
+    return [t for t in times if fit_any >> slot_index(t) & 1]
+
+def pick_resource(date_str: str, start_time: str, duration_min: int, service_name: str | None = None):
+    # best fit: из ресурсов, где блок свободен, берём тот, у кого свободный
+    # промежуток вокруг блока самый короткий — длинные окна остаются целыми
+    open_mask = day_open_mask(date_str)
+    if open_mask is None:
+        return None
+
+    first = slot_index(start_time)
+    last = first + duration_to_slots(duration_min) - 1
+    bm = ((1 << (last - first + 1)) - 1) << first
+    masks = busy_masks.get(date_str, {})
+
+    best, best_gap = None, None
+    for name in compatible_resources(service_name):
+        free = open_mask & ~masks.get(name, 0)
+        if not bm or free & bm != bm:
             continue
-        # блок должен быть свободен
-        if any(x in busy for x in block):
-            continue
-        res.append(t)
+        lo, hi = first, last
+        while lo > 0 and free >> (lo - 1) & 1:
+            lo -= 1
+        while free >> (hi + 1) & 1:
+            hi += 1
+        gap = hi - lo + 1
+        if best_gap is None or gap < best_gap:
+            best, best_gap = name, gap
+    return best
+
+@lru_cache(maxsize=8)
+def _dates_kb(today: str, tail: str):
+    # today входит в ключ кэша, чтобы клавиатура сама обновлялась со сменой дня
+    return ReplyKeyboardMarkup(
+        keyboard=[[KeyboardButton(text=d)] for d in next_14_days()] + [[KeyboardButton(text=tail)]],
+        resize_keyboard=True
+    )
 
-    return res
+def dates_kb(tail: str):
+    # клавиатура "14 дней вперёд" + кнопка выхода (BACK_TO_MENU / CANCEL)
+    return _dates_kb(datetime.today().date().strftime("%Y-%m-%d"), tail)
 
 def fmt_date(date_str: str):
     # для красоты: 2026-02-15 -> 15.02.2026
@@ -233,19 +715,174 @@ def fmt_date(date_str: str):
 
 
 # =========================
-# 6) Dispatcher
+# 6) Router (Dispatcher собирается в create_app)
+# =========================
+router = Router()
+
+
 # =========================
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
+# 6.1) Антифлуд: token bucket на (пользователь, FSM-состояние)
+# =========================
+THROTTLE_RATE = 1.0        # сколько токенов восстанавливается в секунду
+THROTTLE_BURST = 5         # ёмкость ведра (сколько нажатий подряд можно)
+THROTTLE_IDLE_SEC = 600    # через сколько секунд простоя ведро удаляется
+THROTTLE_MAX_BUCKETS = 10000  # жёсткий предел числа вёдер в памяти
+THROTTLE_NOTICE = "⏳ Слишком часто. Подождите пару секунд 🙂"
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    # ведро хранится как list [токены, время_последнего_обновления, уже_предупредили]
+    # ключ — (user_id, состояние), порядок OrderedDict = порядок последней активности
+
+    def __init__(self, rate: float = THROTTLE_RATE, burst: int = THROTTLE_BURST,
+                 idle_sec: float = THROTTLE_IDLE_SEC, max_buckets: int = THROTTLE_MAX_BUCKETS):
+        self.rate = rate
+        self.burst = burst
+        self.idle_sec = idle_sec
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict()
+        self.stats = {"passed": 0, "dropped": 0, "notices": 0, "evicted": 0}
+
+    def _evict(self, now: float):
+        # самые старые вёдра в начале — чистим, пока они простаивают или их слишком много
+        while self.buckets:
+            key, bucket = next(iter(self.buckets.items()))
+            if now - bucket[1] < self.idle_sec and len(self.buckets) <= self.max_buckets:
+                break
+            self.buckets.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def hit(self, key, now: float | None = None):
+        # возвращает (пропустить?, нужно_ли_предупредить)
+        if now is None:
+            now = monotonic()
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = [float(self.burst), now, False]
+            self.buckets[key] = bucket
+        else:
+            tokens = bucket[0] + (now - bucket[1]) * self.rate
+            bucket[0] = tokens if tokens < self.burst else float(self.burst)
+            bucket[1] = now
+            self.buckets.move_to_end(key)
+
+        self._evict(now)
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            self.stats["passed"] += 1
+            return True, False
+
+        self.stats["dropped"] += 1
+        if bucket[2]:
+            return False, False
+        bucket[2] = True
+        self.stats["notices"] += 1
+        return False, True
+
+    async def __call__(self, handler, event, data):
+        user = getattr(event, "from_user", None)
+        if user is None:
+            return await handler(event, data)
 
-# загрузка данных при старте файла
-load_data()
+        allowed, notify = self.hit((user.id, data.get("raw_state")))
+        if allowed:
+            return await handler(event, data)
+
+        if notify:
+            try:
+                await event.answer(THROTTLE_NOTICE)
+            except Exception:
+                pass
+        return None
+
+
+throttling = ThrottlingMiddleware()
+
+
+# =========================
+# 6.2) Асинхронный старт
+# =========================
+# данные грузятся в отдельном потоке, пока бот подключается к Telegram;
+# апдейты принимаются сразу, но хендлеры ждут только готовности данных
+data_ready = asyncio.Event()
+load_failed = False
+_started_at = None
+_first_update_logged = False
+
+
+def warm_caches():
+    # прогреваем то, что клиент увидит первым (всё это — lru_cache)
+    dates_kb(BACK_TO_MENU)
+    dates_kb(CANCEL)
+    _std_times()
+    _std_open_mask()
+
+
+async def load_state(dispatcher: Dispatcher):
+    global load_failed
+    try:
+        await asyncio.to_thread(load_data)
+    except Exception as e:
+        # без данных работать нельзя (и нельзя перезаписать data.json пустыми) — останавливаемся
+        load_failed = True
+        if isinstance(e, DataFileError):
+            print(f"❌ {e}. Бот останавливается — исправь файл и запусти снова.")
+        else:
+            print("❌ Не удалось загрузить данные, бот останавливается:")
+            traceback.print_exc()
+        data_ready.set()  # отпускаем ждущие апдейты, ReadyMiddleware их отбросит
+        try:
+            await dispatcher.stop_polling()
+        except RuntimeError:
+            pass  # polling ещё не запущен (startup вызван вручную) — останавливать нечего
+        return
+    data_ready.set()
+    print(f"✅ Данные загружены за {monotonic() - _started_at:.3f} c")
+    await asyncio.to_thread(warm_caches)
+
+
+class ReadyMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        global _first_update_logged
+        if not data_ready.is_set():
+            await data_ready.wait()
+        if load_failed:
+            return None
+        if not _first_update_logged:
+            _first_update_logged = True
+            print(f"⏱ Первый апдейт через {monotonic() - _started_at:.3f} c после старта")
+        return await handler(event, data)
+
+
+_background_tasks = set()
+
+
+async def on_startup(dispatcher: Dispatcher):
+    global _started_at
+    if _started_at is None:
+        _started_at = monotonic()
+    task = asyncio.create_task(load_state(dispatcher))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def create_app():
+    # фабрика: импорт модуля не трогает диск и сеть, всё собирается здесь
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.update.outer_middleware(ReadyMiddleware())
+    dp.message.outer_middleware(throttling)
+    dp.startup.register(on_startup)
+    dp.include_router(router)
+    return dp
 
 
 # =========================
 # 7) /start
 # =========================
-@dp.message(Command("start"))
+@router.message(Command("start"))
 async def cmd_start(message: Message, state: FSMContext):
     await state.clear()
 
@@ -265,12 +902,12 @@ async def cmd_start(message: Message, state: FSMContext):
     else:
         await message.answer("🤖 Я бот онлайн-записи 🗓", reply_markup=client_kb)
 
-@dp.message(F.text == "👑 Демо админ")
+@router.message(F.text == "👑 Демо админ")
 async def demo_admin(message: Message):
     await message.answer("👑 Админ-панель", reply_markup=admin_kb)
 
 
-@dp.message(F.text == "👤 Демо клиент")
+@router.message(F.text == "👤 Демо клиент")
 async def demo_client(message: Message):
     await message.answer("👤 Клиентский режим", reply_markup=client_kb)
 
@@ -278,7 +915,7 @@ async def demo_client(message: Message):
 # =========================
 # 8) Клиент: контакты / услуги
 # =========================
-@dp.message(F.text == "📍 Контакты")
+@router.message(F.text == "📍 Контакты")
 async def client_contacts(message: Message):
     phone = contacts.get("phone", "")
     address = contacts.get("address", "")
@@ -287,7 +924,7 @@ async def client_contacts(message: Message):
     text += f"🏠 Адрес: {address if address else 'не указан'}\n"
     await message.answer(text)
 
-@dp.message(F.text == "💆‍♀️ Услуги и цены")
+@router.message(F.text == "💆‍♀️ Услуги и цены")
 async def show_services(message: Message):
     if not services:
         await message.answer("Пока нет добавленных услуг.")
@@ -298,7 +935,7 @@ async def show_services(message: Message):
     await message.answer(text)
 
 # ===== Демо режим мастера =====
-@dp.message(F.text == "👀 Демо режим мастера")
+@router.message(F.text == "👀 Демо режим мастера")
 async def demo_admin_mode(message: Message):
     demo_admin_users.add(message.from_user.id)
     await message.answer("🔧 Демо админ-режим включён", reply_markup=admin_kb)
@@ -306,7 +943,7 @@ async def demo_admin_mode(message: Message):
 # =========================
 # 9) Админ: настройка контактов
 # =========================
-@dp.message(F.text == ADMIN_CONTACTS)
+@router.message(F.text == ADMIN_CONTACTS)
 async def admin_contacts_start(message: Message, state: FSMContext):
     if message.from_user.id != MASTER_ID:
         return
@@ -317,7 +954,7 @@ async def admin_contacts_start(message: Message, state: FSMContext):
     )
     await state.set_state(AdminContacts.phone)
 
-@dp.message(AdminContacts.phone)
+@router.message(AdminContacts.phone)
 async def admin_contacts_phone(message: Message, state: FSMContext):
     contacts["phone"] = message.text.strip()
     save_data()
@@ -327,7 +964,7 @@ async def admin_contacts_phone(message: Message, state: FSMContext):
     )
     await state.set_state(AdminContacts.address)
 
-@dp.message(AdminContacts.address)
+@router.message(AdminContacts.address)
 async def admin_contacts_address(message: Message, state: FSMContext):
     contacts["address"] = message.text.strip()
     save_data()
@@ -338,19 +975,20 @@ async def admin_contacts_address(message: Message, state: FSMContext):
 # =========================
 # 10) Админ: расписание
 # =========================
-@dp.message(F.text == "📅 Управление расписанием")
+@router.message(F.text == "📅 Управление расписанием")
 async def admin_schedule_start(message: Message, state: FSMContext):
     if message.from_user.id != MASTER_ID:
         return
 
-    kb = ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=d)] for d in next_14_days()] + [[KeyboardButton(text=BACK_TO_MENU)]],
-        resize_keyboard=True
+    kb = dates_kb(BACK_TO_MENU)
+    await message.answer(
+        "📅 Выберите дату (14 дней вперёд):\n\n"
+        "Для диапазона дат или дней недели — команда /bulk",
+        reply_markup=kb
     )
-    await message.answer("📅 Выберите дату (14 дней вперёд):", reply_markup=kb)
     await state.set_state(AdminSchedule.pick_date)
 
-@dp.message(AdminSchedule.pick_date)
+@router.message(AdminSchedule.pick_date)
 async def admin_pick_date(message: Message, state: FSMContext):
     if message.text == BACK_TO_MENU:
         await state.clear()
@@ -377,21 +1015,18 @@ async def admin_pick_date(message: Message, state: FSMContext):
     await message.answer(f"Дата: {fmt_date(date_str)}\nЧто сделать?", reply_markup=kb)
     await state.set_state(AdminSchedule.pick_action)
 
-@dp.message(AdminSchedule.pick_action, F.text == BACK_TO_DATES)
+@router.message(AdminSchedule.pick_action, F.text == BACK_TO_DATES)
 async def admin_back_to_dates(message: Message, state: FSMContext):
-    kb = ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=d)] for d in next_14_days()] + [[KeyboardButton(text=BACK_TO_MENU)]],
-        resize_keyboard=True
-    )
+    kb = dates_kb(BACK_TO_MENU)
     await message.answer("📅 Выберите дату:", reply_markup=kb)
     await state.set_state(AdminSchedule.pick_date)
 
-@dp.message(AdminSchedule.pick_action, F.text == BACK_TO_MENU)
+@router.message(AdminSchedule.pick_action, F.text == BACK_TO_MENU)
 async def admin_back_to_menu(message: Message, state: FSMContext):
     await state.clear()
     await message.answer("Админ-меню ⚙️", reply_markup=admin_kb)
 
-@dp.message(AdminSchedule.pick_action, F.text == "🚫 Сделать выходным")
+@router.message(AdminSchedule.pick_action, F.text == "🚫 Сделать выходным")
 async def admin_make_day_off(message: Message, state: FSMContext):
     data = await state.get_data()
     date_str = data["date"]
@@ -400,7 +1035,7 @@ async def admin_make_day_off(message: Message, state: FSMContext):
     await message.answer(f"✅ {fmt_date(date_str)} — выходной.", reply_markup=ReplyKeyboardRemove())
     await admin_back_to_dates(message, state)
 
-@dp.message(AdminSchedule.pick_action, F.text == "🔄 Вернуть стандарт (08–20)")
+@router.message(AdminSchedule.pick_action, F.text == "🔄 Вернуть стандарт (08–20)")
 async def admin_restore_default(message: Message, state: FSMContext):
     data = await state.get_data()
     date_str = data["date"]
@@ -409,7 +1044,7 @@ async def admin_restore_default(message: Message, state: FSMContext):
     await message.answer(f"✅ {fmt_date(date_str)} — вернули стандарт 08:00–20:00.", reply_markup=ReplyKeyboardRemove())
     await admin_back_to_dates(message, state)
 
-@dp.message(AdminSchedule.pick_action, F.text == "⏰ Задать часы вручную")
+@router.message(AdminSchedule.pick_action, F.text == "⏰ Задать часы вручную")
 async def admin_manual_hours_start(message: Message, state: FSMContext):
     await message.answer(
         "Введите часы диапазонами:\n"
@@ -424,7 +1059,7 @@ async def admin_manual_hours_start(message: Message, state: FSMContext):
     )
     await state.set_state(AdminSchedule.manual_hours)
 
-@dp.message(AdminSchedule.manual_hours)
+@router.message(AdminSchedule.manual_hours)
 async def admin_manual_hours_save(message: Message, state: FSMContext):
     if message.text == BACK_TO_DATES:
         await admin_back_to_dates(message, state)
@@ -449,10 +1084,203 @@ async def admin_manual_hours_save(message: Message, state: FSMContext):
     await admin_back_to_dates(message, state)
 
 
+# =========================
+# 10.1) Админ: массовые изменения расписания
+# =========================
+# /bulk 2026-03-01..2026-03-07 off
+# /bulk 2026-03-01..2026-05-31 пн,ср,пт 10-14, 16-18
+# /bulk 2026-03-01..2026-03-07 std
+BULK_MAX_DAYS = 366
+TG_TEXT_LIMIT = 4096  # длина одного сообщения в Telegram
+WEEKDAYS = {"пн": 0, "вт": 1, "ср": 2, "чт": 3, "пт": 4, "сб": 5, "вс": 6}
+BULK_HELP = (
+    "Массовое изменение расписания:\n"
+    "/bulk ДАТА..ДАТА [дни] off — выходные\n"
+    "/bulk ДАТА..ДАТА [дни] std — стандарт 08–20\n"
+    "/bulk ДАТА..ДАТА [дни] 10-12, 16-18 — свои часы\n\n"
+    "Дни недели необязательны: пн,вт,ср,чт,пт,сб,вс\n"
+    "Пример: /bulk 2026-03-01..2026-03-31 сб,вс off"
+)
+
+
+def parse_bulk_command(text: str):
+    # возвращает (даты, новые_часы); новые_часы: None — выходной, "std" — стандарт, list — свои.
+    # ValueError с понятной причиной — до того, как что-то проверяется или сохраняется
+    parts = text.split(maxsplit=2)
+    if len(parts) < 3:
+        raise ValueError("мало аргументов")
+
+    try:
+        start_s, end_s = parts[1].split("..")
+        start = datetime.strptime(start_s, "%Y-%m-%d").date()
+        end = datetime.strptime(end_s, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError("даты нужны в виде ГГГГ-ММ-ДД..ГГГГ-ММ-ДД")
+    if end < start or (end - start).days >= BULK_MAX_DAYS:
+        raise ValueError(f"конец раньше начала или диапазон длиннее {BULK_MAX_DAYS} дней")
+
+    # дни недели в начале: "пн,ср", "пн, ср", "пн ср" — пустые куски пропускаем
+    rest = parts[2].strip()
+    weekdays = None
+    while True:
+        rest = rest.lstrip(", ")
+        m = re.match(r"([а-яё]+)(?=[\s,]|$)", rest, re.IGNORECASE)
+        if not m:
+            break
+        day = m.group(1).lower()
+        if day not in WEEKDAYS:
+            raise ValueError(f"неизвестный день недели: {m.group(1)}")
+        weekdays = (weekdays or set()) | {WEEKDAYS[day]}
+        rest = rest[m.end():]
+    if not rest:
+        raise ValueError("не указано, что делать")
+
+    action = rest.strip()
+    if action.lower() == "off":
+        times = None
+    elif action.lower() == "std":
+        times = "std"
+    else:
+        # диапазоны разбираем один раз на всю пачку
+        try:
+            times = parse_ranges(action)
+        except ValueError:
+            raise ValueError("часы нужны в виде 10-12, 16-18")
+        if not times:
+            raise ValueError("в указанных часах нет ни одного слота (начало должно быть раньше конца)")
+
+    dates = []
+    cur = start
+    while cur <= end:
+        if weekdays is None or cur.weekday() in weekdays:
+            dates.append(cur.strftime("%Y-%m-%d"))
+        cur += timedelta(days=1)
+    return dates, times
+
+
+def plan_bulk_schedule(dates: list[str], times):
+    # одна проверка на всю пачку: какие записи не влезут в новое расписание
+    std_times = set(gen_times(BASE_START, BASE_END, STEP_MIN))
+    new_set = std_times if times == "std" else (set(times) if times else set())
+
+    conflicts = []
+    for d in dates:
+        for b in appointments.get(d, []):
+            if not all(t in new_set for t in b.get("block", [])):
+                conflicts.append((d, b))
+    return conflicts
+
+
+def render_bulk_conflicts(conflicts: list, limit: int = TG_TEXT_LIMIT):
+    # отчёт о конфликтах в одно сообщение: если строк больше, чем влезает,
+    # обрезаем и в конце пишем, сколько ещё не показано
+    head = f"❌ Ничего не изменено: {len(conflicts)} записей не помещаются в новое расписание.\n"
+    tail = "\nУдалите или перенесите эти записи и повторите команду."
+    more = f"…и ещё {len(conflicts)}"  # запас под самую длинную строку «…и ещё N»
+
+    lines = []
+    size = len(head) + len(tail) + len(more) + 1
+    for d, b in conflicts:
+        line = f"{fmt_date(d)} {b['time']} — {b['service']} — {b['name']} ({b['phone']})"
+        if size + len(line) + 1 > limit:
+            lines.append(f"…и ещё {len(conflicts) - len(lines)}")
+            break
+        lines.append(line)
+        size += len(line) + 1
+    return head + "\n" + "\n".join(lines) + "\n" + tail
+
+
+def apply_bulk_schedule(dates: list[str], times):
+    for d in dates:
+        if times == "std":
+            overrides.pop(d, None)
+        else:
+            overrides[d] = None if times is None else list(times)
+    save_data()  # одна запись файла на всю пачку
+
+
+@router.message(Command("bulk"))
+async def admin_bulk_schedule(message: Message):
+    if message.from_user.id != MASTER_ID:
+        return
+
+    try:
+        dates, times = parse_bulk_command(message.text)
+    except ValueError as e:
+        await message.answer(f"❌ {e}\n\n{BULK_HELP}")
+        return
+
+    if not dates:
+        await message.answer("В диапазоне нет подходящих дней.")
+        return
+
+    conflicts = plan_bulk_schedule(dates, times)
+    if conflicts:
+        await message.answer(render_bulk_conflicts(conflicts))
+        return
+
+    apply_bulk_schedule(dates, times)
+
+    if times is None:
+        what = "выходные"
+    elif times == "std":
+        what = "стандарт 08:00–20:00"
+    else:
+        what = f"часы {times[0]}–{times[-1]} ({len(times)} слотов)"
+    await message.answer(
+        f"✅ Обновлено дней: {len(dates)} ({fmt_date(dates[0])} — {fmt_date(dates[-1])}): {what}.",
+        reply_markup=admin_kb
+    )
+
+
+# =========================
+# 10.2) Админ: ресурсы (кабинеты / столы / ассистенты)
+# =========================
+# /resources                               — показать
+# /resources Стол 1; Стол 2: Массаж шеи    — задать (после ":" — только эти услуги)
+@router.message(Command("resources"))
+async def admin_resources(message: Message):
+    global resources
+    if message.from_user.id != MASTER_ID:
+        return
+
+    parts = message.text.split(maxsplit=1)
+    if len(parts) > 1:
+        new_resources = []
+        for item in parts[1].split(";"):
+            name, _, svc = item.partition(":")
+            name = name.strip()
+            if not name:
+                continue
+            new_resources.append({
+                "name": name,
+                "services": [x.strip() for x in svc.split(",") if x.strip()],
+            })
+
+        names = {r["name"] for r in new_resources}
+        if not new_resources or len(names) != len(new_resources):
+            await message.answer("❌ Нужен хотя бы один ресурс, имена не должны повторяться.")
+            return
+        in_use = {b.get("resource") for _, b in bookings_by_id.values()} - names
+        if in_use:
+            await message.answer(f"❌ На этих ресурсах есть записи: {', '.join(sorted(in_use))}")
+            return
+
+        resources = new_resources
+        save_data()
+
+    lines = ["🛏 Ресурсы:"]
+    for r in resources:
+        lines.append(f"• {r['name']} — {', '.join(r['services']) if r.get('services') else 'все услуги'}")
+    lines.append("")
+    lines.append("Задать: /resources Стол 1; Стол 2: Массаж шеи, Массаж спины")
+    await message.answer("\n".join(lines))
+
+
 # =========================
 # 11) Клиент: запись (услуга -> дата -> время -> имя -> телефон)
 # =========================
-@dp.message(F.text == "📅 Записаться")
+@router.message(F.text == "📅 Записаться")
 async def booking_start(message: Message, state: FSMContext):
     if not services:
         await message.answer("Пока нет услуг. Мастер ещё не добавил услуги.")
@@ -466,7 +1294,7 @@ async def booking_start(message: Message, state: FSMContext):
     await message.answer("Выберите услугу:", reply_markup=kb)
     await state.set_state(Booking.pick_service)
 
-@dp.message(Booking.pick_service)
+@router.message(Booking.pick_service)
 async def booking_pick_service(message: Message, state: FSMContext):
     if message.text == CANCEL:
         await state.clear()
@@ -482,37 +1310,52 @@ async def booking_pick_service(message: Message, state: FSMContext):
 
     await state.update_data(service=service)
 
-    kb = ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=d)] for d in next_14_days()] + [[KeyboardButton(text=CANCEL)]],
-        resize_keyboard=True
-    )
+    kb = dates_kb(CANCEL)
     await message.answer("Выберите дату:", reply_markup=kb)
     await state.set_state(Booking.pick_date)
 
-@dp.message(Booking.pick_date)
+@router.message(Booking.pick_date)
 async def booking_pick_date(message: Message, state: FSMContext):
     if message.text == CANCEL:
         await state.clear()
         await message.answer("Ок 🙂", reply_markup=client_kb)
         return
 
+    data = await state.get_data()
+    service = data["service"]
+    duration = service["duration"]
+
+    if message.text in (WAIT_THIS_DATE, WAIT_ANY_DATE) and data.get("wait_date"):
+        dates = [data["wait_date"]] if message.text == WAIT_THIS_DATE else next_14_days()
+        add_to_waitlist(message.from_user.id, service, dates)
+        save_data()
+        await state.clear()
+        await message.answer("🔔 Готово! Напишем, как только освободится подходящее время.", reply_markup=client_kb)
+        return
+
     date_str = message.text.strip()
     if date_str not in next_14_days():
         await message.answer("Выберите дату кнопкой.")
         return
 
-    data = await state.get_data()
-    service = data["service"]
-    duration = service["duration"]
-
     # выходной
     if day_times(date_str) is None:
         await message.answer("🚫 В этот день мастер не работает. Выберите другую дату.")
         return
 
-    starts = available_start_times_for_service(date_str, duration)
+    starts = available_start_times_for_service(date_str, duration, service["name"])
     if not starts:
-        await message.answer("На этот день нет свободных окон под выбранную услугу. Выберите другую дату.")
+        await state.update_data(wait_date=date_str)
+        kb = ReplyKeyboardMarkup(
+            keyboard=[[KeyboardButton(text=WAIT_THIS_DATE)], [KeyboardButton(text=WAIT_ANY_DATE)]]
+                    + [[KeyboardButton(text=d)] for d in next_14_days()] + [[KeyboardButton(text=CANCEL)]],
+            resize_keyboard=True
+        )
+        await message.answer(
+            "На этот день нет свободных окон под выбранную услугу. "
+            "Выберите другую дату или встаньте в лист ожидания.",
+            reply_markup=kb
+        )
         return
 
     await state.update_data(date=date_str)
@@ -524,7 +1367,7 @@ async def booking_pick_date(message: Message, state: FSMContext):
     await message.answer("Выберите время:", reply_markup=kb)
     await state.set_state(Booking.pick_time)
 
-@dp.message(Booking.pick_time)
+@router.message(Booking.pick_time)
 async def booking_pick_time(message: Message, state: FSMContext):
     if message.text == CANCEL:
         await state.clear()
@@ -538,7 +1381,7 @@ async def booking_pick_time(message: Message, state: FSMContext):
     start_time = message.text.strip()
 
     # финальная проверка (на случай, если кто-то занял время секунду назад)
-    starts = available_start_times_for_service(date_str, duration)
+    starts = available_start_times_for_service(date_str, duration, service["name"])
     if start_time not in starts:
         await message.answer("Это время уже заняли 😿 Выберите другое время.")
         return
@@ -547,7 +1390,7 @@ async def booking_pick_time(message: Message, state: FSMContext):
     await message.answer("Введите ваше имя:", reply_markup=ReplyKeyboardRemove())
     await state.set_state(Booking.enter_name)
 
-@dp.message(Booking.enter_name)
+@router.message(Booking.enter_name)
 async def booking_enter_name(message: Message, state: FSMContext):
     name = message.text.strip()
     if len(name) < 2:
@@ -557,7 +1400,7 @@ async def booking_enter_name(message: Message, state: FSMContext):
     await message.answer("Введите телефон (например +375...):")
     await state.set_state(Booking.enter_phone)
 
-@dp.message(Booking.enter_phone)
+@router.message(Booking.enter_phone)
 async def booking_enter_phone(message: Message, state: FSMContext):
     phone = message.text.strip()
     if len(phone) < 6:
@@ -572,9 +1415,16 @@ async def booking_enter_phone(message: Message, state: FSMContext):
 
     block = build_block(start_time, service["duration"])
 
+    # пока клиент вводил имя и телефон, время могли занять на всех ресурсах
+    resource = pick_resource(date_str, start_time, service["duration"], service["name"])
+    if resource is None:
+        await state.clear()
+        await message.answer("Это время уже заняли 😿 Попробуйте записаться снова.", reply_markup=client_kb)
+        return
+
     # записываем
     booking = {
-        "id": int(datetime.now().timestamp() * 1000),  # уникальный id
+        "id": new_booking_id(),  # уникальный монотонный id
         "time": start_time,
         "name": name,
         "phone": phone,
@@ -582,12 +1432,12 @@ async def booking_enter_phone(message: Message, state: FSMContext):
         "duration": service["duration"],
         "price": service["price"],
         "block": block,
+        "resource": resource,
         "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
 
-    appointments.setdefault(date_str, []).append(booking)
-    # сортируем записи по времени внутри дня
-    appointments[date_str] = sorted(appointments[date_str], key=lambda x: x["time"])
+    add_booking(date_str, booking)
+    drop_waitlist_for(message.from_user.id, service["name"])
     save_data()
 
     # клиент
@@ -614,6 +1464,7 @@ async def booking_enter_phone(message: Message, state: FSMContext):
             f"Цена: {booking['price']} BYN\n"
             f"Клиент: {booking['name']}\n"
             f"Телефон: {booking['phone']}"
+            + (f"\nРесурс: {booking['resource']}" if len(resources) > 1 else "")
         )
         await bot.session.close()
     except Exception:
@@ -663,7 +1514,7 @@ def render_records_for_dates(dates: list[str]):
     return "\n".join(lines).strip()
 
 
-@dp.message(F.text == ADMIN_RECORDS_TODAY)
+@router.message(F.text == ADMIN_RECORDS_TODAY)
 async def admin_records_today(message: Message):
     if message.from_user.id != MASTER_ID:
         return
@@ -671,7 +1522,7 @@ async def admin_records_today(message: Message):
     text = render_records_for_dates([today])
     await message.answer(text)
 
-@dp.message(F.text == ADMIN_RECORDS_TOM)
+@router.message(F.text == ADMIN_RECORDS_TOM)
 async def admin_records_tom(message: Message):
     if message.from_user.id != MASTER_ID:
         return
@@ -679,7 +1530,7 @@ async def admin_records_tom(message: Message):
     text = render_records_for_dates([tom])
     await message.answer(text)
 
-@dp.message(F.text == ADMIN_RECORDS_ALL)
+@router.message(F.text == ADMIN_RECORDS_ALL)
 async def admin_records_all(message: Message):
     if message.from_user.id != MASTER_ID:
         return
@@ -691,7 +1542,7 @@ async def admin_records_all(message: Message):
 # =========================
 # 13) Админ: удалить запись (освобождает время)
 # =========================
-@dp.message(F.text == ADMIN_DELETE)
+@router.message(F.text == ADMIN_DELETE)
 async def admin_delete_start(message: Message, state: FSMContext):
     if message.from_user.id != MASTER_ID:
         return
@@ -709,7 +1560,7 @@ async def admin_delete_start(message: Message, state: FSMContext):
     await message.answer("Выберите дату, где удалить запись:", reply_markup=kb)
     await state.set_state(AdminDelete.pick_date)
 
-@dp.message(AdminDelete.pick_date)
+@router.message(AdminDelete.pick_date)
 async def admin_delete_pick_date(message: Message, state: FSMContext):
     if message.text == CANCEL:
         await state.clear()
@@ -722,11 +1573,13 @@ async def admin_delete_pick_date(message: Message, state: FSMContext):
         await message.answer("На этой дате нет записей. Выберите другую.")
         return
 
-    await state.update_data(date=date_str)
+    # день уже отсортирован по времени; запоминаем id, чтобы удалять по индексу
+    await state.update_data(date=date_str, ids=[b["id"] for b in day_list])
 
     text = f"📅 {fmt_date(date_str)}\nВыберите номер записи для удаления:\n\n"
-    for i, b in enumerate(sorted(day_list, key=lambda x: x["time"]), 1):
-        text += f"{i}) {b['time']} — {b['service']} — {b['name']} ({b['phone']})\n"
+    for i, b in enumerate(day_list, 1):
+        text += f"{i}) {b['time']} — {b['service']} — {b['name']} ({b['phone']})"
+        text += f" [{b.get('resource', '')}]\n" if len(resources) > 1 else "\n"
 
     kb = ReplyKeyboardMarkup(
         keyboard=[[KeyboardButton(text=str(i))] for i in range(1, len(day_list) + 1)] + [[KeyboardButton(text=CANCEL)]],
@@ -735,7 +1588,7 @@ async def admin_delete_pick_date(message: Message, state: FSMContext):
     await message.answer(text, reply_markup=kb)
     await state.set_state(AdminDelete.pick_booking)
 
-@dp.message(AdminDelete.pick_booking)
+@router.message(AdminDelete.pick_booking)
 async def admin_delete_pick_booking(message: Message, state: FSMContext):
     if message.text == CANCEL:
         await state.clear()
@@ -744,30 +1597,33 @@ async def admin_delete_pick_booking(message: Message, state: FSMContext):
 
     data = await state.get_data()
     date_str = data["date"]
-    day_list = sorted(appointments.get(date_str, []), key=lambda x: x["time"])
+    ids = data.get("ids", [])
 
     if not message.text.isdigit():
         await message.answer("Нужно нажать номер кнопкой.")
         return
 
     idx = int(message.text) - 1
-    if idx < 0 or idx >= len(day_list):
+    if idx < 0 or idx >= len(ids):
         await message.answer("Неверный номер.")
         return
 
-    deleted = day_list[idx]
-
-    # удаляем конкретный объект из оригинального списка по id
-    original = appointments.get(date_str, [])
-    appointments[date_str] = [b for b in original if b.get("id") != deleted.get("id")]
-
-    # если день пустой — можно удалить ключ
-    if not appointments[date_str]:
-        appointments.pop(date_str, None)
+    # удаляем конкретную запись по id через индекс
+    removed = remove_booking(ids[idx])
+    if removed is None:
+        await state.clear()
+        await message.answer("Эту запись уже удалили.", reply_markup=admin_kb)
+        return
+    _, deleted = removed
 
     save_data()
     await state.clear()
 
+    # время освободилось — оповещаем лист ожидания в фоне
+    task = asyncio.create_task(notify_waitlist(message.bot, date_str))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
     await message.answer(
         "✅ Запись удалена, время освобождено:\n"
         f"{fmt_date(date_str)} {deleted['time']} — {deleted['service']} — {deleted['name']}",
@@ -775,10 +1631,98 @@ async def admin_delete_pick_booking(message: Message, state: FSMContext):
     )
 
 
+# =========================
+# 13.1) Админ: счётчики антифлуда
+# =========================
+@router.message(Command("throttle"))
+async def admin_throttle_stats(message: Message):
+    if message.from_user.id != MASTER_ID:
+        return
+    st = throttling.stats
+    await message.answer(
+        "🛡 Антифлуд:\n"
+        f"Пропущено: {st['passed']}\n"
+        f"Отброшено: {st['dropped']}\n"
+        f"Предупреждений: {st['notices']}\n"
+        f"Вёдер в памяти: {len(throttling.buckets)}\n"
+        f"Удалено по простою: {st['evicted']}"
+    )
+
+
+# =========================
+# 13.2) Админ: статистика и экспорт
+# =========================
+EXPORTERS = {"csv": export_csv, "jsonl": export_jsonl}
+
+@router.message(F.text == ADMIN_STATS)
+async def admin_stats(message: Message):
+    if message.from_user.id != MASTER_ID:
+        return
+
+    revenue, count, minutes = stats.total
+    lines = [
+        "📊 Статистика за всё время:",
+        f"Записей: {count}, выручка: {revenue} BYN, часов: {minutes / 60:.1f}",
+        "",
+        "💆‍♀️ По услугам:",
+    ]
+    for name, (r, c, m) in sorted(stats.by_service.items(), key=lambda x: -x[1][0]):
+        lines.append(f"{name}: {c} зап., {r} BYN")
+    if not stats.by_service:
+        lines.append("нет")
+
+    lines.append("")
+    lines.append("🗓 По неделям (последние 4):")
+    weeks = sorted(stats.by_week.items())[-4:]
+    for week, (r, c, m) in weeks:
+        lines.append(f"{week}: {c} зап., {r} BYN, {m / 60:.1f} ч")
+    if not weeks:
+        lines.append("нет")
+
+    lines.append("")
+    lines.append("📅 Загрузка на 14 дней:")
+    for d in next_14_days():
+        times = day_times(d)
+        if times is None:
+            lines.append(f"{fmt_date(d)} — выходной")
+            continue
+        r, c, m = stats.by_day.get(d, (0, 0, 0))
+        util = stats.utilization(d, len(times) * STEP_MIN * len(resources))
+        lines.append(f"{fmt_date(d)}: {c} зап., {r} BYN, загрузка {util:.0%}")
+
+    await message.answer("\n".join(lines))
+
+@router.message(Command("export"))
+async def admin_export(message: Message):
+    # /export — CSV, /export jsonl — JSON Lines
+    if message.from_user.id != MASTER_ID:
+        return
+
+    parts = message.text.split()
+    fmt = parts[1].lower() if len(parts) > 1 else "csv"
+    if fmt not in EXPORTERS:
+        await message.answer("Формат: /export или /export jsonl")
+        return
+
+    # снимок дней берём здесь, на event loop; файл пишем кусками в отдельном потоке.
+    # У каждого вызова свой временный файл — параллельные /export не мешают друг другу
+    days = snapshot_days(appointments)
+    fd, path = tempfile.mkstemp(prefix="export_", suffix="." + fmt)
+    os.close(fd)
+    try:
+        count = await asyncio.to_thread(EXPORTERS[fmt], path, iter_bookings(days))
+        await message.answer_document(
+            FSInputFile(path, filename=f"export.{fmt}"),
+            caption=f"📤 Экспорт: {count} записей"
+        )
+    finally:
+        os.remove(path)
+
+
 # =========================
 # 14) Админ: свободные окна (все 14 дней)
 # =========================
-@dp.message(F.text == ADMIN_FREE)
+@router.message(F.text == ADMIN_FREE)
 async def admin_free_all(message: Message):
     if message.from_user.id != MASTER_ID:
         return
@@ -812,15 +1756,20 @@ async def admin_free_all(message: Message):
 # 15) RUN
 # =========================
 async def main():
+    global _started_at
+    _started_at = monotonic()
+    dp = create_app()
     bot = Bot(BOT_TOKEN)
     await dp.start_polling(bot)
 
 if __name__ == "__main__":
+    acquire_lock()
     try:
         asyncio.run(main())
     finally:
-        if os.path.exists(LOCK_FILE):
-            os.remove(LOCK_FILE)
+        release_lock()
+    if load_failed:
+        sys.exit(1)
 
 
 
@@ -0,0 +1,54 @@
+import os
+import sys
+import random
+from timeit import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+# Доступность и выбор ресурса при 1–50 ресурсах:
+#   python benchmarks/resources.py [вызовов_на_замер]
+#
+# Для каждого числа ресурсов день заполняется случайными записями
+# (≈30 попыток на ресурс, как плотный рабочий день), затем замеряются
+# available_start_times_for_service() и pick_resource().
+DATE = "2026-03-02"
+RESOURCE_COUNTS = (1, 2, 5, 10, 25, 50)
+
+
+def fill_day(n: int):
+    app.resources[:] = [{"name": f"R{i}", "services": []} for i in range(n)]
+    app.overrides.clear()
+    app.appointments.clear()
+    app.reindex_appointments()
+
+    made = 0
+    for _ in range(n * 30):
+        duration = random.choice((30, 60, 90))
+        starts = app.available_start_times_for_service(DATE, duration)
+        if not starts:
+            continue
+        t = random.choice(starts)
+        app.add_booking(DATE, {
+            "id": app.new_booking_id(), "time": t, "service": "x", "duration": duration,
+            "price": 1, "block": app.build_block(t, duration),
+            "resource": app.pick_resource(DATE, t, duration),
+        })
+        made += 1
+    return made
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    random.seed(1)
+    print(f"{'ресурсов':>8} {'записей':>8} {'доступность, мкс':>18} {'выбор ресурса, мкс':>20}")
+    for n in RESOURCE_COUNTS:
+        made = fill_day(n)
+        avail = timeit(lambda: app.available_start_times_for_service(DATE, 60), number=calls)
+        pick = timeit(lambda: app.pick_resource(DATE, "10:00", 60), number=calls)
+        print(f"{n:>8} {made:>8} {avail / calls * 1e6:>18.1f} {pick / calls * 1e6:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
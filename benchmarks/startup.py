@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import random
+import tempfile
+import subprocess
+from datetime import date, timedelta
+
+# Замер холодного старта:
+#   python benchmarks/startup.py [число_записей]
+#
+# 1) время `import app` в чистом интерпретаторе (и отдельно — самого aiogram);
+# 2) время от старта до первого обработанного апдейта: create_app(), startup
+#    (загрузка data.json в потоке) и сразу же апдейт через feed_update —
+#    без сети, поэтому подключение к Telegram сюда не входит.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+t = time.perf_counter()
+import aiogram, aiogram.types
+t_aiogram = time.perf_counter() - t
+t = time.perf_counter()
+import app
+print(f"{t_aiogram:.3f} {time.perf_counter() - t:.3f}")
+"""
+
+FIRST_UPDATE_SNIPPET = """
+import asyncio, time
+from datetime import datetime
+from aiogram import Bot
+from aiogram.types import Update, Message, Chat, User
+import app
+
+async def run():
+    t = time.perf_counter()
+    app._started_at = time.monotonic()
+    dp = app.create_app()
+    bot = Bot("123456:BENCH")
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    t_startup = time.perf_counter() - t
+    update = Update(update_id=1, message=Message(
+        message_id=1, date=datetime.now(), text="ping",
+        chat=Chat(id=1, type="private"),
+        from_user=User(id=1, is_bot=False, first_name="bench"),
+    ))
+    await dp.feed_update(bot, update)
+    t_first = time.perf_counter() - t
+    await asyncio.gather(*app._background_tasks)
+    await bot.session.close()
+    print(f"{t_startup:.3f} {t_first:.3f} {len(app.bookings_by_id)}")
+
+asyncio.run(run())
+"""
+
+
+def make_data(path: str, count: int):
+    random.seed(1)
+    start = date(2025, 1, 1)
+    appointments = {}
+    for i in range(count):
+        d = (start + timedelta(days=i // 20)).strftime("%Y-%m-%d")
+        t = f"{8 + (i % 20) // 2:02d}:{30 * (i % 2):02d}"
+        appointments.setdefault(d, []).append({
+            "id": i + 1, "time": t, "name": "n", "phone": "123456",
+            "service": "Массаж шеи", "duration": 30, "price": 50,
+            "block": [t], "created_at": "2025-01-01 10:00:00",
+        })
+    data = {
+        "services": [{"name": "Массаж шеи", "price": 50, "duration": 30}],
+        "overrides": {}, "appointments": appointments,
+        "contacts": {"phone": "", "address": ""},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def run(snippet: str, cwd: str):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    out = subprocess.run([sys.executable, "-c", snippet], cwd=cwd, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return out.strip().splitlines()[-1].split()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as tmp:
+        make_data(os.path.join(tmp, "data.json"), count)
+        run(IMPORT_SNIPPET, tmp)  # прогрев .pyc
+
+        t_aiogram, t_app = run(IMPORT_SNIPPET, tmp)
+        t_startup, t_first, loaded = run(FIRST_UPDATE_SNIPPET, tmp)
+
+    print(f"записей в data.json:        {count}")
+    print(f"import aiogram:             {t_aiogram} c")
+    print(f"import app (после aiogram): {t_app} c")
+    print(f"startup (create_app+hooks): {t_startup} c")
+    print(f"первый апдейт обработан:    {t_first} c (загружено {loaded} записей)")
+
+
+if __name__ == "__main__":
+    main()
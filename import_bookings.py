@@ -0,0 +1,246 @@
+import os
+import sys
+import csv
+import json
+import math
+import argparse
+from collections import Counter
+from datetime import date, datetime
+from itertools import islice
+
+import app
+
+
+# =========================
+# Импорт старых записей из CSV / JSONL в data.json
+# =========================
+# python import_bookings.py bookings.csv
+# python import_bookings.py bookings.jsonl --dry-run
+#
+# Строки читаются потоком и проверяются пачками. Внутри пачки записи
+# группируются по дням и идут по возрастанию времени; пересечения ловятся
+# по битмаскам занятости ресурсов (как в боте), без попарных сравнений.
+# Отклонённые строки сразу пишутся в файл с причиной и в памяти не копятся.
+# Всё принятое сохраняется одним атомарным save_data() в самом конце.
+BATCH_SIZE = 10000
+REJECT_FIELDS = ["line", "reason", "raw"]
+
+
+def read_rows(path: str, fmt: str):
+    # генератор (номер_строки, dict)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            for n, row in enumerate(csv.DictReader(f), 2):
+                yield n, row
+        else:
+            for n, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield n, row if isinstance(row, dict) else {"__raw__": line}
+
+
+def _text(row: dict, key: str):
+    value = row.get(key)
+    return "" if value is None else str(value).strip()
+
+
+def parse_row(row: dict, services_by_name: dict, resource_names: set):
+    # возвращает (date_str, booking) или бросает ValueError с причиной
+    if "__raw__" in row:
+        raise ValueError("не JSON-объект")
+
+    # strptime на миллионе строк слишком медленный — разбираем руками
+    date_str = _text(row, "date")
+    try:
+        if len(date_str) != 10:
+            raise ValueError
+        date.fromisoformat(date_str)
+    except ValueError:
+        raise ValueError("неверная дата")
+
+    start_time = _text(row, "time")
+    try:
+        h, m = map(int, start_time.split(":"))
+    except ValueError:
+        raise ValueError("неверное время")
+    if not (0 <= h < 24 and 0 <= m < 60):
+        raise ValueError("неверное время")
+    if (h * 60 + m) % app.STEP_MIN:
+        raise ValueError("время не на сетке слотов")
+    start_time = f"{h:02d}:{m:02d}"
+
+    service = services_by_name.get(_text(row, "service"))
+    if service is None:
+        raise ValueError("неизвестная услуга")
+
+    name = _text(row, "name")
+    phone = _text(row, "phone")
+    if not name or not phone:
+        raise ValueError("нет имени или телефона")
+
+    try:
+        duration = int(_text(row, "duration") or service["duration"])
+        price = float(_text(row, "price") or service["price"])
+    except ValueError:
+        raise ValueError("неверная длительность или цена")
+    if duration <= 0 or duration % app.STEP_MIN:
+        raise ValueError("длительность не кратна шагу слотов")
+    # float() пропускает nan/inf — в data.json это невалидный JSON, а в статистике nan
+    if not math.isfinite(price) or price < 0:
+        raise ValueError("неверная длительность или цена")
+    if price.is_integer():
+        price = int(price)
+
+    resource = _text(row, "resource")
+    if resource and resource not in resource_names:
+        raise ValueError("неизвестный ресурс")
+
+    booking_id = _text(row, "id")
+    if booking_id:
+        try:
+            booking_id = int(booking_id)
+        except ValueError:
+            raise ValueError("неверный id")
+
+    return date_str, {
+        "id": booking_id or None,
+        "time": start_time,
+        "name": name,
+        "phone": phone,
+        "service": service["name"],
+        "duration": duration,
+        "price": price,
+        "block": app.build_block(start_time, duration),
+        "resource": resource or None,
+        "created_at": _text(row, "created_at") or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def place_booking(date_str: str, booking: dict):
+    # проверка по сетке дня и по занятости ресурсов; возвращает причину отказа или None
+    open_mask = app.day_open_mask(date_str)
+    if open_mask is None:
+        return "выходной день"
+    first = app.slot_index(booking["time"])
+    bm = ((1 << app.duration_to_slots(booking["duration"])) - 1) << first
+    if open_mask & bm != bm:
+        return "вне рабочих часов"
+
+    if booking["id"] is not None and booking["id"] in app.bookings_by_id:
+        return "такой id уже есть"
+
+    if booking["resource"] is None:
+        booking["resource"] = app.pick_resource(date_str, booking["time"], booking["duration"], booking["service"])
+        if booking["resource"] is None:
+            return "пересекается с другой записью"
+    else:
+        if booking["resource"] not in app.compatible_resources(booking["service"]):
+            return "ресурс не подходит для услуги"
+        busy = app.busy_masks.get(date_str, {}).get(booking["resource"], 0)
+        if busy & bm:
+            return "пересекается с другой записью"
+
+    if booking["id"] is None:
+        booking["id"] = app.new_booking_id()
+    app.add_booking(date_str, booking)
+    return None
+
+
+def load_existing():
+    # load_data() создаёт data.json, если его нет — для --dry-run это лишнее.
+    # Сломанный файл (синтаксис или содержимое) — app.DataFileError, импорт не начинается
+    if not os.path.exists(app.DATA_FILE):
+        app.reindex_appointments()
+        return
+    app.load_data()
+
+
+def import_bookings(path: str, fmt: str, rejects_path: str, batch_size: int = BATCH_SIZE, dry_run: bool = False):
+    load_existing()
+    services_by_name = {s["name"]: s for s in app.services}
+    resource_names = {r["name"] for r in app.resources}
+
+    accepted = 0
+    reasons = Counter()
+    rows = read_rows(path, fmt)
+
+    with open(rejects_path, "w", encoding="utf-8", newline="") as rf:
+        rejects = csv.writer(rf)
+        rejects.writerow(REJECT_FIELDS)
+
+        def reject(n, reason, row):
+            reasons[reason] += 1
+            rejects.writerow([n, reason, json.dumps(row, ensure_ascii=False)])
+
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+
+            parsed = []
+            for n, row in batch:
+                try:
+                    date_str, booking = parse_row(row, services_by_name, resource_names)
+                except ValueError as e:
+                    reject(n, str(e), row)
+                    continue
+                parsed.append((date_str, booking["time"], n, booking, row))
+
+            # по дням и по времени — длинные окна занимаются в порядке начала
+            parsed.sort(key=lambda x: (x[0], x[1], x[2]))
+            for date_str, _, n, booking, row in parsed:
+                reason = place_booking(date_str, booking)
+                if reason:
+                    reject(n, reason, row)
+                else:
+                    accepted += 1
+
+    if accepted and not dry_run:
+        app.save_data()  # одна атомарная запись на весь импорт
+
+    return accepted, reasons
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Импорт записей из CSV/JSONL в data.json")
+    parser.add_argument("path", help="файл с записями (.csv или .jsonl)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="по умолчанию — по расширению файла")
+    parser.add_argument("--rejects", help="куда писать отклонённые строки (по умолчанию <файл>.rejected.csv)")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="размер пачки")
+    parser.add_argument("--dry-run", action="store_true", help="только проверить, data.json не менять")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f"❌ Файл не найден: {args.path}")
+        return 1
+    # bot.lock держим весь импорт: бот не стартует посреди импорта и не перезапишет data.json
+    if not args.dry_run and not app.try_lock():
+        print("❌ Бот запущен (или идёт другой импорт). Останови его перед импортом, иначе он перезапишет data.json.")
+        return 1
+
+    fmt = args.format or ("jsonl" if args.path.endswith((".jsonl", ".json")) else "csv")
+    rejects_path = args.rejects or args.path + ".rejected.csv"
+
+    try:
+        accepted, reasons = import_bookings(args.path, fmt, rejects_path, args.batch, args.dry_run)
+    except app.DataFileError as e:
+        print(f"❌ {e}. Импорт отменён.")
+        return 1
+    finally:
+        if not args.dry_run:
+            app.release_lock()
+
+    print(f"✅ Принято: {accepted}" + (" (dry run, data.json не изменён)" if args.dry_run else ""))
+    print(f"❌ Отклонено: {sum(reasons.values())}" + (f" → {rejects_path}" if reasons else ""))
+    for reason, count in reasons.most_common():
+        print(f"   {reason}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
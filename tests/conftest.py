@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+@pytest.fixture
+def clean_app(tmp_path, monkeypatch):
+    # пустое состояние бота и data.json во временной папке
+    monkeypatch.setattr(app, "DATA_FILE", str(tmp_path / "data.json"))
+    monkeypatch.setattr(app, "services", [])
+    monkeypatch.setattr(app, "overrides", {})
+    monkeypatch.setattr(app, "appointments", {})
+    monkeypatch.setattr(app, "resources", [{"name": "Стол 1", "services": []}])
+    app.reindex_appointments()
+    app.reindex_waitlist([])
+    yield app
+    app.reindex_appointments()
+    app.reindex_waitlist([])
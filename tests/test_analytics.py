@@ -0,0 +1,42 @@
+import csv
+import json
+
+from analytics import Aggregates, snapshot_days, iter_bookings, export_csv, export_jsonl
+
+
+def booking(i, t, price=50, duration=30, service="Массаж шеи"):
+    return {"id": i, "time": t, "name": "n", "phone": "1", "service": service,
+            "duration": duration, "price": price, "created_at": ""}
+
+
+def test_aggregates_add_remove_roundtrip():
+    stats = Aggregates()
+    stats.add("2026-03-02", booking(1, "10:00"))
+    stats.add("2026-03-02", booking(2, "11:00", price=120, duration=90, service="Общий массаж"))
+    assert stats.total == [170, 2, 120]
+    assert stats.by_week == {"2026-W10": [170, 2, 120]}
+    assert stats.utilization("2026-03-02", 240) == 0.5
+
+    stats.remove("2026-03-02", booking(1, "10:00"))
+    stats.remove("2026-03-02", booking(2, "11:00", price=120, duration=90, service="Общий массаж"))
+    assert stats.total == [0, 0, 0]
+    assert stats.by_day == stats.by_week == stats.by_service == {}
+
+
+def test_export_uses_snapshot(tmp_path):
+    appointments = {"2026-03-03": [booking(2, "12:00")], "2026-03-02": [booking(1, "10:00")]}
+    days = snapshot_days(appointments)
+
+    # после снимка хендлеры меняют данные — экспорт этого не видит
+    appointments.pop("2026-03-02")
+    appointments["2026-03-03"].append(booking(3, "13:00"))
+
+    path = tmp_path / "out.csv"
+    assert export_csv(str(path), iter_bookings(days), chunk_size=1) == 2
+    with open(path, encoding="utf-8") as f:
+        assert [r["id"] for r in csv.DictReader(f)] == ["1", "2"]
+
+    path = tmp_path / "out.jsonl"
+    assert export_jsonl(str(path), iter_bookings(days)) == 2
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["date"] for line in f] == ["2026-03-02", "2026-03-03"]
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+
+def make_booking(app, t, duration=30, booking_id=None):
+    return {
+        "id": app.new_booking_id() if booking_id is None else booking_id,
+        "time": t,
+        "name": "n",
+        "phone": "123456",
+        "service": "s",
+        "duration": duration,
+        "price": 10,
+        "block": app.build_block(t, duration),
+    }
+
+
+def test_new_booking_id_unique_across_threads(clean_app):
+    app = clean_app
+    per_thread = 5000
+    results = [[] for _ in range(8)]
+
+    def worker(out):
+        for _ in range(per_thread):
+            out.append(app.new_booking_id())
+
+    threads = [threading.Thread(target=worker, args=(out,)) for out in results]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    all_ids = [i for out in results for i in out]
+    assert len(set(all_ids)) == len(all_ids)
+    for out in results:
+        assert out == sorted(out)
+    assert max(all_ids) < 2 ** 53
+
+
+def test_ids_from_threads_with_sorted_insert(clean_app):
+    # конкурентна здесь только выдача id: сами вставки бот делает из одного
+    # потока (event loop), поэтому add_booking сериализуется локом.
+    # Гонку на уровне хендлеров проверяет test_concurrent_booking_same_slot_one_wins
+    app = clean_app
+    times = app.gen_times(app.BASE_START, app.BASE_END)
+    barrier = threading.Barrier(len(times))
+
+    def worker(t):
+        booking = make_booking(app, t)
+        barrier.wait()
+        with lock:
+            app.add_booking("2026-03-02", booking)
+
+    lock = threading.Lock()
+    threads = [threading.Thread(target=worker, args=(t,)) for t in reversed(times)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    day = app.appointments["2026-03-02"]
+    assert [b["time"] for b in day] == times
+    assert len(app.bookings_by_id) == len(times)
+    assert app.available_start_times_for_service("2026-03-02", 30) == []
+
+
+def test_remove_booking_by_id(clean_app):
+    app = clean_app
+    bookings = [make_booking(app, t) for t in ("12:00", "10:00", "11:00")]
+    for b in bookings:
+        app.add_booking("2026-03-02", b)
+
+    date_str, removed = app.remove_booking(bookings[2]["id"])
+    assert (date_str, removed) == ("2026-03-02", bookings[2])
+    assert [b["time"] for b in app.appointments["2026-03-02"]] == ["10:00", "12:00"]
+    assert app.remove_booking(bookings[2]["id"]) is None
+
+    app.remove_booking(bookings[0]["id"])
+    app.remove_booking(bookings[1]["id"])
+    assert "2026-03-02" not in app.appointments
+    assert app.bookings_by_id == {}
+
+
+def test_load_data_reassigns_colliding_ids(clean_app):
+    app = clean_app
+    data = {
+        "services": [],
+        "overrides": {},
+        "appointments": {
+            "2026-03-02": [
+                make_booking(app, "12:00", booking_id=5),
+                make_booking(app, "10:00", booking_id=5),
+                {k: v for k, v in make_booking(app, "14:00").items() if k != "id"},
+            ],
+        },
+    }
+    with open(app.DATA_FILE, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+    app.load_data()
+
+    day = app.appointments["2026-03-02"]
+    ids = [b["id"] for b in day]
+    assert len(set(ids)) == 3
+    assert len(app.bookings_by_id) == 3
+    # каждая запись удаляется сама по себе
+    app.remove_booking(day[0]["id"])
+    assert [b["time"] for b in app.appointments["2026-03-02"]] == ["12:00", "14:00"]
+
+    with open(app.DATA_FILE, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert len({b["id"] for b in saved["appointments"]["2026-03-02"]}) == 3
+
+
+class FakeState:
+    def __init__(self, data):
+        self.data = data
+
+    async def get_data(self):
+        await asyncio.sleep(0)  # точка переключения, как у настоящего storage
+        return dict(self.data)
+
+    async def clear(self):
+        self.data = {}
+
+
+class FakeMessage:
+    def __init__(self, user_id, text):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.text = text
+        self.answers = []
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+
+async def _book_concurrently(app, requests):
+    service = {"name": "Массаж спины", "price": 80, "duration": 60}
+    calls = []
+    for user_id, date_str, t in requests:
+        state = FakeState({"service": service, "date": date_str, "time": t, "name": f"user{user_id}"})
+        calls.append((FakeMessage(user_id, "+375291234567"), state))
+    await asyncio.gather(*(app.booking_enter_phone(m, s) for m, s in calls))
+    return [m for m, _ in calls]
+
+
+def test_concurrent_booking_same_slot_one_wins(clean_app):
+    app = clean_app
+    d = app.next_14_days()[1]
+    messages = asyncio.run(_book_concurrently(app, [(u, d, "10:00") for u in range(20)]))
+
+    won = [m for m in messages if m.answers[0].startswith("✅ Вы записаны")]
+    lost = [m for m in messages if m.answers[0].startswith("Это время уже заняли")]
+    assert len(won) == 1 and len(lost) == 19
+    assert [b["time"] for b in app.appointments[d]] == ["10:00"]
+    assert app.appointments[d][0]["name"] == f"user{won[0].from_user.id}"
+
+
+def test_concurrent_bookings_different_slots_unique_ids(clean_app):
+    app = clean_app
+    d = app.next_14_days()[1]
+    starts = ["08:00", "09:00", "10:00", "11:00", "12:00", "13:00", "14:00", "15:00"]
+    messages = asyncio.run(_book_concurrently(app, [(u, d, t) for u, t in enumerate(reversed(starts))]))
+
+    assert all(m.answers[0].startswith("✅ Вы записаны") for m in messages)
+    day = app.appointments[d]
+    assert [b["time"] for b in day] == starts
+    assert len({b["id"] for b in day}) == len(starts) == len(app.bookings_by_id)
@@ -0,0 +1,62 @@
+import pytest
+
+
+def test_parse_bulk_weekdays_with_spaces(clean_app):
+    app = clean_app
+    for text in ("/bulk 2027-03-01..2027-03-07 пн, ср 10-12, 16-18",
+                 "/bulk 2027-03-01..2027-03-07 пн,ср 10-12, 16-18",
+                 "/bulk 2027-03-01..2027-03-07 Пн ,, ср 10-12, 16-18"):
+        dates, times = app.parse_bulk_command(text)
+        assert dates == ["2027-03-01", "2027-03-03"]
+        assert times == ["10:00", "10:30", "11:00", "11:30", "16:00", "16:30", "17:00", "17:30"]
+
+
+@pytest.mark.parametrize("text, reason", [
+    ("/bulk 2027-03-01..2027-03-02 12-10", "нет ни одного слота"),
+    ("/bulk 2027-03-01..2027-03-02 10-10", "нет ни одного слота"),
+    ("/bulk 2027-03-01..2027-03-02 пн, хз off", "неизвестный день недели"),
+    ("/bulk 2027-03-02..2027-03-01 off", "конец раньше начала"),
+    ("/bulk 2027-03-01..2027-03-02 10-xx", "часы нужны"),
+    ("/bulk 2027-03-01..2027-03-02 пн", "не указано"),
+])
+def test_parse_bulk_rejects_before_commit(clean_app, text, reason):
+    with pytest.raises(ValueError, match=reason):
+        clean_app.parse_bulk_command(text)
+    assert clean_app.overrides == {}
+
+
+def test_bulk_conflicts_and_apply(clean_app):
+    app = clean_app
+    app.add_booking("2027-03-01", {"id": app.new_booking_id(), "time": "09:00", "service": "s",
+                                   "duration": 60, "price": 1, "block": ["09:00", "09:30"]})
+    dates, times = app.parse_bulk_command("/bulk 2027-03-01..2027-03-02 10-12")
+    assert [d for d, _ in app.plan_bulk_schedule(dates, times)] == ["2027-03-01"]
+
+    dates, times = app.parse_bulk_command("/bulk 2027-03-01..2027-03-02 вт off")
+    assert app.plan_bulk_schedule(dates, times) == []
+    app.apply_bulk_schedule(dates, times)
+    assert app.overrides == {"2027-03-02": None}
+
+
+def _conflicts(count):
+    d = "2027-03-01"
+    return [(d, {"time": "09:00", "service": "Массаж спины", "name": f"Клиент {i}", "phone": "+375291234567"})
+            for i in range(count)]
+
+
+def test_bulk_conflict_report_fits_one_message(clean_app):
+    app = clean_app
+    text = app.render_bulk_conflicts(_conflicts(500))
+    assert len(text) <= app.TG_TEXT_LIMIT
+    shown = text.count("Клиент ")
+    assert 0 < shown < 500
+    assert f"…и ещё {500 - shown}" in text
+    assert text.startswith("❌ Ничего не изменено: 500 записей")
+    assert text.endswith("повторите команду.")
+
+
+def test_bulk_conflict_report_short_list_not_truncated(clean_app):
+    app = clean_app
+    text = app.render_bulk_conflicts(_conflicts(3))
+    assert text.count("Клиент ") == 3
+    assert "…и ещё" not in text
@@ -0,0 +1,89 @@
+import json
+import os
+
+import pytest
+
+import import_bookings
+
+SERVICES = [{"name": "Массаж шеи", "price": 50, "duration": 30},
+            {"name": "Общий массаж", "price": 120, "duration": 90}]
+
+
+@pytest.fixture
+def importer(clean_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(clean_app, "LOCK_FILE", str(tmp_path / "bot.lock"))
+    with open(clean_app.DATA_FILE, "w", encoding="utf-8") as f:
+        json.dump({"services": SERVICES, "overrides": {}, "appointments": {}}, f)
+    return clean_app
+
+
+def write_csv(tmp_path, lines):
+    path = tmp_path / "in.csv"
+    path.write_text("date,time,service,name,phone,price\n" + "\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def read_rejects(path):
+    with open(path + ".rejected.csv", encoding="utf-8") as f:
+        return [line.split(",")[1] for line in f.read().splitlines()[1:]]
+
+
+def test_import_rejects_bad_prices_and_overlaps(importer, tmp_path):
+    path = write_csv(tmp_path, [
+        "2026-03-02,10:00,Общий массаж,a,1,",      # 10:00–11:30
+        "2026-03-02,11:00,Массаж шеи,b,1,",        # пересекается
+        "2026-03-02,11:30,Массаж шеи,c,1,nan",
+        "2026-03-02,11:30,Массаж шеи,d,1,inf",
+        "2026-03-02,11:30,Массаж шеи,e,1,-5",
+        "2026-03-02,11:30,Массаж шеи,f,1,40",
+        "2026-03-02,12:15,Массаж шеи,g,1,",
+        "2026-03-02,12:00,Нет такой,h,1,",
+    ])
+    assert import_bookings.main([path]) == 0
+
+    assert read_rejects(path) == [
+        "неверная длительность или цена", "неверная длительность или цена", "неверная длительность или цена",
+        "время не на сетке слотов", "неизвестная услуга", "пересекается с другой записью",
+    ]
+    with open(importer.DATA_FILE, encoding="utf-8") as f:
+        saved = json.load(f)
+    day = saved["appointments"]["2026-03-02"]
+    assert [(b["time"], b["price"]) for b in day] == [("10:00", 120), ("11:30", 40)]
+    assert not os.path.exists(importer.LOCK_FILE)
+
+
+def test_dry_run_does_not_create_data_file(importer, tmp_path):
+    os.remove(importer.DATA_FILE)
+    path = write_csv(tmp_path, ["2026-03-02,10:00,Массаж шеи,a,1,"])
+    assert import_bookings.main([path, "--dry-run"]) == 0
+    assert not os.path.exists(importer.DATA_FILE)
+
+
+def test_import_refuses_while_locked(importer, tmp_path):
+    assert importer.try_lock()
+    path = write_csv(tmp_path, ["2026-03-02,10:00,Массаж шеи,a,1,"])
+    assert import_bookings.main([path]) == 1
+    with open(importer.DATA_FILE, encoding="utf-8") as f:
+        assert json.load(f)["appointments"] == {}
+    importer.release_lock()
+
+
+def test_import_refuses_broken_data_file(importer, tmp_path):
+    with open(importer.DATA_FILE, "w", encoding="utf-8") as f:
+        f.write("{broken")
+    path = write_csv(tmp_path, ["2026-03-02,10:00,Массаж шеи,a,1,"])
+    assert import_bookings.main([path]) == 1
+    with open(importer.DATA_FILE, encoding="utf-8") as f:
+        assert f.read() == "{broken"
+    assert not os.path.exists(importer.LOCK_FILE)
+
+
+def test_import_refuses_semantically_broken_data_file(importer, tmp_path):
+    broken = {"services": SERVICES, "appointments": {"2026-03-02": [{"name": "без времени"}]}}
+    with open(importer.DATA_FILE, "w", encoding="utf-8") as f:
+        json.dump(broken, f)
+    path = write_csv(tmp_path, ["2026-03-02,10:00,Массаж шеи,a,1,"])
+    assert import_bookings.main([path]) == 1
+    with open(importer.DATA_FILE, encoding="utf-8") as f:
+        assert json.load(f) == broken
+    assert not os.path.exists(importer.LOCK_FILE)
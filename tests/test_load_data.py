@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+SERVICES = [{"name": "Массаж шеи", "price": 50, "duration": 30}]
+
+
+def good_booking(t="10:00"):
+    return {"id": 1, "time": t, "name": "n", "phone": "1", "service": "Массаж шеи",
+            "duration": 30, "price": 50, "block": [t]}
+
+
+def write(app, data):
+    with open(app.DATA_FILE, "w", encoding="utf-8") as f:
+        if isinstance(data, str):
+            f.write(data)
+        else:
+            json.dump(data, f)
+
+
+@pytest.mark.parametrize("data", [
+    "{broken",
+    [],
+    {"services": [{"name": "x"}]},
+    {"services": SERVICES, "appointments": {"2026-03-02": [{k: v for k, v in good_booking().items() if k != "time"}]}},
+    {"services": SERVICES, "appointments": {"2026-03-02": [dict(good_booking(), block=None)]}},
+    {"services": SERVICES, "overrides": {"2026-03-02": "10-12"}},
+])
+def test_load_data_raises_and_keeps_state(clean_app, data):
+    app = clean_app
+    app.services.append({"name": "был", "price": 1, "duration": 30})
+    write(app, data)
+    with open(app.DATA_FILE, encoding="utf-8") as f:
+        before = f.read()
+
+    with pytest.raises(app.DataFileError):
+        app.load_data()
+
+    # ни данные в памяти, ни файл не тронуты
+    assert app.services == [{"name": "был", "price": 1, "duration": 30}]
+    with open(app.DATA_FILE, encoding="utf-8") as f:
+        assert f.read() == before
+
+
+def test_load_data_accepts_valid_file(clean_app):
+    app = clean_app
+    write(app, {"services": SERVICES, "appointments": {"2026-03-02": [good_booking()]}})
+    app.load_data()
+    assert app.services == SERVICES
+    assert list(app.bookings_by_id) == [1]
+
+
+def test_startup_with_broken_data_fails_fast(clean_app, monkeypatch, capsys):
+    import asyncio
+    from datetime import datetime
+
+    from aiogram import Bot
+    from aiogram.types import Chat, Message, Update, User
+
+    app = clean_app
+    monkeypatch.setattr(app, "data_ready", asyncio.Event())
+    monkeypatch.setattr(app, "load_failed", False)
+    monkeypatch.setattr(app, "_started_at", None)
+    write(app, {"services": SERVICES, "appointments": {"2026-03-02": [{"name": "без времени"}]}})
+
+    update = Update(update_id=1, message=Message(
+        message_id=1, date=datetime.now(), text="/start",
+        chat=Chat(id=1, type="private"), from_user=User(id=1, is_bot=False, first_name="t"),
+    ))
+
+    async def run():
+        dp = app.create_app()
+        bot = Bot("123456:TEST")
+        try:
+            await dp.emit_startup(bot=bot, dispatcher=dp)
+            # апдейт пришёл раньше, чем закончилась загрузка: ждёт её и отбрасывается
+            # (если бы дошёл до /start, хендлер полез бы в сеть и упал)
+            result = await dp.feed_update(bot, update)
+            await asyncio.gather(*app._background_tasks)
+        finally:
+            await bot.session.close()
+        return result
+
+    assert asyncio.run(run()) is None
+    assert app.load_failed
+    assert app.data_ready.is_set()
+    assert "Бот останавливается" in capsys.readouterr().out
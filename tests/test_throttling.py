@@ -0,0 +1,56 @@
+from app import ThrottlingMiddleware
+
+
+def test_burst_then_drop_with_single_notice():
+    t = ThrottlingMiddleware(rate=1.0, burst=3)
+    key = (1, None)
+    assert [t.hit(key, now=0.0) for _ in range(3)] == [(True, False)] * 3
+    # ведро пустое: первое лишнее нажатие — с предупреждением, дальше молча
+    assert t.hit(key, now=0.0) == (False, True)
+    assert t.hit(key, now=0.1) == (False, False)
+    assert t.hit(key, now=0.2) == (False, False)
+    assert t.stats == {"passed": 3, "dropped": 3, "notices": 1, "evicted": 0}
+
+
+def test_refill_over_time_resets_notice():
+    t = ThrottlingMiddleware(rate=2.0, burst=2)
+    key = (1, "Booking:pick_date")
+    t.hit(key, now=0.0)
+    t.hit(key, now=0.0)
+    assert t.hit(key, now=0.0) == (False, True)
+    # через 0.5 c набежал один токен
+    assert t.hit(key, now=0.5) == (True, False)
+    assert t.hit(key, now=0.5) == (False, True)
+    # ведро не переполняется выше burst
+    assert t.hit(key, now=100.0) == (True, False)
+    assert t.hit(key, now=100.0) == (True, False)
+    assert t.hit(key, now=100.0) == (False, True)
+
+
+def test_buckets_are_per_user_and_state():
+    t = ThrottlingMiddleware(rate=1.0, burst=1)
+    assert t.hit((1, None), now=0.0) == (True, False)
+    assert t.hit((1, "Booking:pick_time"), now=0.0) == (True, False)
+    assert t.hit((2, None), now=0.0) == (True, False)
+    assert t.hit((1, None), now=0.0) == (False, True)
+
+
+def test_idle_buckets_are_evicted():
+    t = ThrottlingMiddleware(rate=1.0, burst=1, idle_sec=10)
+    t.hit((1, None), now=0.0)
+    t.hit((2, None), now=5.0)
+    t.hit((3, None), now=12.0)
+    assert list(t.buckets) == [(2, None), (3, None)]
+    assert t.stats["evicted"] == 1
+    # активность двигает ведро в конец — оно переживает соседей
+    t.hit((2, None), now=14.0)
+    t.hit((4, None), now=23.0)
+    assert list(t.buckets) == [(2, None), (4, None)]
+
+
+def test_max_buckets_cap():
+    t = ThrottlingMiddleware(rate=1.0, burst=1, idle_sec=1000, max_buckets=3)
+    for user_id in range(10):
+        t.hit((user_id, None), now=float(user_id))
+    assert list(t.buckets) == [(7, None), (8, None), (9, None)]
+    assert t.stats["evicted"] == 7
@@ -0,0 +1,100 @@
+import json
+
+
+def test_load_data_drops_malformed_waitlist_entries(clean_app):
+    app = clean_app
+    future = app.next_14_days()[1]
+    good = {"id": 10, "user_id": 1, "service": "Массаж шеи", "duration": 30, "dates": [future]}
+    data = {
+        "services": [], "overrides": {}, "appointments": {},
+        "waitlist": [
+            {"id": 11, "user_id": 2, "service": "Массаж шеи", "duration": 30},
+            {"user_id": 3, "service": "Массаж шеи", "duration": 30, "dates": [future]},
+            "мусор",
+            good,
+            {"id": 12, "user_id": 4, "service": "Массаж шеи", "duration": 30, "dates": ["2000-01-01"]},
+        ],
+    }
+    with open(app.DATA_FILE, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+    app.load_data()
+
+    assert list(app.waitlist_by_id) == [10]
+    assert [(e["id"], starts) for e, starts in app.match_waitlist(future)] == \
+        [(10, app.available_start_times_for_service(future, 30))]
+
+
+def _book(app, date_str, t, resource, duration=60):
+    app.add_booking(date_str, {"id": app.new_booking_id(), "time": t, "service": "x", "duration": duration,
+                               "price": 1, "block": app.build_block(t, duration), "resource": resource})
+
+
+def test_match_waitlist_respects_service_resources(clean_app):
+    app = clean_app
+    app.resources[:] = [{"name": "A", "services": ["Массаж шеи"]},
+                        {"name": "B", "services": ["Массаж спины"]}]
+    d = app.next_14_days()[1]
+    app.overrides[d] = ["10:00", "10:30"]
+    _book(app, d, "10:00", "A")
+    _book(app, d, "10:00", "B")
+
+    back = app.add_to_waitlist(1, {"name": "Массаж спины", "duration": 60}, [d])
+    neck = app.add_to_waitlist(2, {"name": "Массаж шеи", "duration": 60}, [d])
+
+    # освободился только A — подходит лишь для шеи
+    app.remove_booking(app.appointments[d][0]["id"])
+    assert [e for e, _ in app.match_waitlist(d)] == [neck]
+    # тот, кто ждёт массаж спины, остаётся в очереди
+    assert back["id"] in app.waitlist_by_id
+    assert app.match_waitlist(d) == []
+
+    app.remove_booking(app.appointments[d][0]["id"])
+    assert [e for e, _ in app.match_waitlist(d)] == [back]
+
+
+def test_match_waitlist_limited_to_freed_capacity(clean_app):
+    app = clean_app
+    d, other = app.next_14_days()[1:3]
+    app.overrides[d] = ["10:00", "10:30"]
+    _book(app, d, "10:00", "Стол 1")
+    waiting = [app.add_to_waitlist(u, {"name": "Массаж шеи", "duration": 60}, [d, other]) for u in range(15)]
+
+    # одно окно на 60 минут — зовём одного человека, а не WAITLIST_BATCH
+    app.remove_booking(app.appointments[d][0]["id"])
+    assert [e for e, _ in app.match_waitlist(d)] == [waiting[0]]
+    assert len(app.waitlist_by_id) == 15
+    # первого сняли только с предложенной даты — на другую дату он ждёт первым
+    assert waiting[0]["dates"] == [other]
+    assert app.waitlist_index[d][("Массаж шеи", 60)][0] == waiting[1]["id"]
+    assert app.waitlist_index[other][("Массаж шеи", 60)][0] == waiting[0]["id"]
+
+
+def test_match_waitlist_shares_freed_window_between_services(clean_app):
+    app = clean_app
+    d = app.next_14_days()[1]
+    app.overrides[d] = ["10:00", "10:30", "11:00"]
+    _book(app, d, "10:00", "Стол 1", duration=90)
+    long = app.add_to_waitlist(1, {"name": "Массаж спины", "duration": 60}, [d])
+    short = app.add_to_waitlist(2, {"name": "Массаж шеи", "duration": 30}, [d])
+    app.add_to_waitlist(3, {"name": "Массаж шеи", "duration": 30}, [d])
+
+    # 90 минут: 60 первому по очереди и 30 следующему, третьему места нет
+    app.remove_booking(app.appointments[d][0]["id"])
+    assert [e for e, _ in app.match_waitlist(d)] == [long, short]
+
+
+def test_removed_waitlist_entry_leaves_no_stale_ids(clean_app):
+    app = clean_app
+    d1, d2 = app.next_14_days()[1:3]
+    old = app.add_to_waitlist(1, {"name": "Массаж шеи", "duration": 30}, [d1, d2])
+    new = app.add_to_waitlist(1, {"name": "Массаж шеи", "duration": 30}, [d2])
+
+    # повторная заявка заменила старую и на d1, и на d2
+    assert old["id"] not in app.waitlist_by_id
+    assert d1 not in app.waitlist_index
+    assert list(app.waitlist_index[d2][("Массаж шеи", 30)]) == [new["id"]]
+
+    app.drop_waitlist_for(1, "Массаж шеи")
+    assert app.waitlist_by_id == {}
+    assert app.waitlist_index == {}